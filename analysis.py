@@ -1,116 +1,360 @@
-import pandas as pd
-import sqlite3
-import matplotlib.pyplot as plt
-import seaborn as sns
-from scipy.stats import ttest_ind
+import argparse
+import math
+from part4_query import build_subject_count_query, group_moments, subject_counts
+from data_access import get_pool, iter_frames, read_frame, sort_categories
+from query_cache import get_cache, normalize_filters
+from instrumentation import peak_rss_mb, span
+from schema import CELL_POPULATIONS, DB_FILE, FREQUENCY_VIEW, PARQUET_DIR, TABLE_NAME, VIEW_COLUMNS
+# numpy, scipy (hypothesis_tests) and matplotlib (boxplots) are imported inside the
+# functions that use them, so the text-only subset analysis starts without loading them
 
 # --- Configuration ---
-DB_FILE = "cell_counts.db"
-TABLE_NAME = "cell_counts"
+# Database, view and column names come from schema.py
 SIGNIFICANCE_THRESHOLD = 0.05
-CELL_POPULATIONS = ['b_cell', 'cd8_t_cell', 'cd4_t_cell', 'nk_cell', 'monocyte']
+CORRECTION_METHOD = 'bh'  # 'bh' (Benjamini-Hochberg) or 'bonferroni'
+BACKENDS = ['sqlite', 'parquet']
+# 'samples' tests per-sample values; 'moments' tests from per-group SQL aggregates;
+# 'streaming' reads samples in chunks into bounded-memory accumulators
+STATS_MODES = ['samples', 'moments', 'streaming']
+STREAM_CHUNK_SIZE = 100_000
+# Analyses run by default; `cli.py subset` / `cli.py stats` run one of them
+ANALYSIS_PARTS = ['subset', 'stats']
+BOXPLOT_FILE = 'responder_analysis_boxplot.png'
+# Response groups in plot (hue) order
+RESPONSE_GROUPS = ['no', 'yes']
+
+# Compact in-memory dtypes for fetched columns: categoricals for repeated strings, int32 for
+# integers. 'sample' is unique per row, so it is never fetched.
+COLUMN_DTYPES = {
+    column: 'category' if sql_type == 'TEXT' else 'int32'
+    for column, sql_type in VIEW_COLUMNS.items() if column != 'sample'
+}
+# Same columns read from the frequency view, where populations are percentages
+FREQUENCY_DTYPES = {
+    **COLUMN_DTYPES,
+    'total_count': 'int32',
+    **{pop: 'float32' for pop in CELL_POPULATIONS},
+}
+
+# Columns each analysis actually touches; only these are fetched from the database
+STATISTICAL_COLUMNS = ['response'] + CELL_POPULATIONS
+SUBSET_COLUMNS = ['project', 'subject_id', 'response', 'sex']
+SUBSET_GROUP_COLUMNS = ['project', 'response', 'sex']
+
+# Equality filters for each analysis; shared by the SQL and Parquet backends
+PBMC_FILTERS = {'sample_type': 'PBMC'}
+BASELINE_MELANOMA_FILTERS = {'condition': 'melanoma', 'time': 0}
 
 def get_db_connection():
-    """Establishes a connection to the SQLite database."""
-    return sqlite3.connect(DB_FILE)
+    """
+    Borrows a pooled, read-only connection to the SQLite database.
+    Use it as a context manager: `with get_db_connection() as conn: ...`
+    """
+    return get_pool(DB_FILE).connection()
 
-def run_statistical_analysis():
+def build_select_query(columns, filters=None, table=TABLE_NAME):
     """
-    Performs the main statistical analysis comparing cell frequencies
-    between responders and non-responders. (Corresponds to Part 3)
+    Builds a parameterized SELECT over a view (cell_counts by default) projecting
+    only the given columns and filtering on column = value pairs. Returns (sql, params).
+    """
+    query = f"SELECT {', '.join(columns)} FROM {table}"
+    params = []
+    if filters:
+        query += " WHERE " + " AND ".join(f"{col} = ?" for col in filters)
+        params = list(filters.values())
+    return query, params
+
+def read_columns(query, columns, dtypes=COLUMN_DTYPES, params=()):
+    """
+    Runs a projected query and returns a DataFrame with compact dtypes, fetched
+    through the columnar Arrow path when it is available.
+    """
+    return read_frame(query, params, {col: dtypes[col] for col in columns}, DB_FILE)
+
+def read_parquet_columns(view, columns, filters=None, dtypes=COLUMN_DTYPES):
+    """
+    Reads the Parquet copy of a view with column pruning and predicate pushdown.
+    Filters on the partition columns (project, condition) skip whole directories;
+    other filters are pushed down to Parquet row-group statistics.
     """
-    print("\n--- Starting Statistical Analysis (Part 3) ---")
-    conn = get_db_connection()
-    
     try:
-        # This query selects the data for the main analysis.
-        # We are looking for all PBMC samples, regardless of condition or treatment initially.
-        query = f"SELECT * FROM {TABLE_NAME} WHERE sample_type = 'PBMC'"
-        df = pd.read_sql_query(query, conn)
-        print(f"Loaded {len(df)} PBMC samples for analysis.")
-
-        # Melt the data to make it easy to plot and analyze
-        df_melted = df.melt(
-            id_vars=['subject_id', 'response'],
-            value_vars=CELL_POPULATIONS,
-            var_name='population',
-            value_name='count'
+        import pyarrow.dataset as ds
+    except ImportError:
+        raise ImportError("The Parquet backend requires pyarrow (pip install pyarrow).") from None
+
+    # Categorical columns are decoded straight into Arrow dictionaries, which map to pandas categoricals
+    categorical = [col for col in columns if dtypes[col] == 'category']
+    file_format = ds.ParquetFileFormat(read_options=ds.ParquetReadOptions(dictionary_columns=categorical))
+    dataset = ds.dataset(f"{PARQUET_DIR}/{view}", format=file_format, partitioning='hive')
+    expression = None
+    for col, value in (filters or {}).items():
+        condition = ds.field(col) == value
+        expression = condition if expression is None else expression & condition
+    table = dataset.to_table(columns=columns, filter=expression)
+    return sort_categories(table.to_pandas().astype({col: dtypes[col] for col in columns}))
+
+def load_columns(view, columns, filters, dtypes=COLUMN_DTYPES, backend='sqlite'):
+    """Fetches the given columns of a view from either the SQLite or the Parquet backend."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}'. Expected one of {BACKENDS}.")
+    if backend == 'parquet':
+        return read_parquet_columns(view, columns, filters, dtypes)
+    query, params = build_select_query(columns, filters, table=view)
+    return read_columns(query, columns, dtypes, params)
+
+# --- Queries (kept at module level so check_query_plans.py can verify they are index-served) ---
+# All PBMC samples, regardless of condition or treatment
+PBMC_QUERY, PBMC_PARAMS = build_select_query(STATISTICAL_COLUMNS, PBMC_FILTERS, table=FREQUENCY_VIEW)
+# Unique baseline melanoma subjects, overall (key None) and per group column
+SUBSET_QUERIES = {
+    column: build_subject_count_query(column, **BASELINE_MELANOMA_FILTERS)
+    for column in [None] + SUBSET_GROUP_COLUMNS
+}
+
+def load_response_moments(populations=CELL_POPULATIONS):
+    """
+    Fetches (n, sum, sum of squares) per population for PBMC responders and
+    non-responders in one SQL GROUP BY (served from the cohort cube).
+    Returns two triples of arrays, (responders, non_responders).
+    """
+    import numpy as np
+    moments = group_moments('response', 'frequency', populations, **PBMC_FILTERS)
+    empty = {pop: (0, 0, 0) for pop in populations}
+
+    def triple(group):
+        stats = moments.get(group, empty)
+        return tuple(np.array([stats[pop][i] or 0 for pop in populations], dtype=float) for i in range(3))
+
+    return triple('yes'), triple('no')
+
+def stream_response_summaries(chunksize=STREAM_CHUNK_SIZE, populations=CELL_POPULATIONS):
+    """
+    Streams PBMC frequencies from SQLite in chunks into one StreamingSummary per
+    response group, so memory is bounded by the chunk size rather than the
+    number of samples. Returns (responders, non_responders, rows streamed); the
+    row count includes PBMC samples without a response.
+    """
+    from streaming_stats import StreamingSummary
+    query, params = build_select_query(['response'] + populations, PBMC_FILTERS, table=FREQUENCY_VIEW)
+    summaries = {group: StreamingSummary(populations) for group in ['yes', 'no']}
+    rows = 0
+    for chunk in iter_frames(query, params, chunksize, db_file=DB_FILE):
+        rows += len(chunk)
+        for group, summary in summaries.items():
+            summary.update(chunk.loc[chunk['response'] == group, populations].to_numpy(dtype=float))
+    return summaries['yes'], summaries['no'], rows
+
+def print_box_summary(summaries):
+    """Prints quartiles and whiskers per population and response group from {response: box stats}."""
+    print("\n--- Boxplot Summary (estimated from quantile sketches) ---")
+    print(f"{'Population':<12} {'Response':<9} {'n':>8} {'Whisker lo':>11} {'Q1':>8} {'Median':>8} {'Q3':>8} {'Whisker hi':>11}")
+    for pop in CELL_POPULATIONS:
+        for group in ['yes', 'no']:
+            box = summaries[group][pop]
+            print(f"{pop:<12} {group:<9} {box['n']:>8} {box['whislo']:>11.2f} {box['q1']:>8.2f} "
+                  f"{box['med']:>8.2f} {box['q3']:>8.2f} {box['whishi']:>11.2f}")
+
+def plot_response_boxplot(summaries, output_filename=BOXPLOT_FILE):
+    """Draws the responder boxplot from precomputed summaries {response: {population: stats}}."""
+    from boxplots import draw_boxplot
+    with span('plot'):
+        draw_boxplot(
+            summaries, CELL_POPULATIONS, RESPONSE_GROUPS, output_filename,
+            title='Relative Frequencies by Population and Response Status (PBMC Samples)',
+            ylabel='Relative Frequency (%)',
+            xlabel='Cell Population',
         )
+    print(f"\nBoxplot visualization saved as '{output_filename}'")
 
-        # --- Data Visualization (Boxplot) ---
-        plt.figure(figsize=(12, 8))
-        sns.boxplot(x='population', y='count', hue='response', data=df_melted)
-        plt.title('Cell Counts by Population and Response Status (PBMC Samples)')
-        plt.ylabel('Relative Frequency (Count)')
-        plt.xlabel('Cell Population')
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        
-        output_filename = 'responder_analysis_boxplot.png'
-        plt.savefig(output_filename)
-        print(f"\nBoxplot visualization saved as '{output_filename}'")
-
-        # --- Statistical Significance Testing ---
-        print("\n--- Statistical Significance Report ---")
-        print(f"Comparing cell counts between responders and non-responders across all PBMC samples.")
-        print(f"Using Independent Samples t-test. Significance threshold p < {SIGNIFICANCE_THRESHOLD}.")
-
-        for pop in CELL_POPULATIONS:
-            print("-" * 30)
-            print(f"Population: {pop}")
-            responders = df[df['response'] == 'yes'][pop]
-            non_responders = df[df['response'] == 'no'][pop]
-            if len(responders) > 1 and len(non_responders) > 1:
-                t_stat, p_value = ttest_ind(responders, non_responders, nan_policy='omit')
-                print(f"  - P-value: {p_value:.4f}")
-                if p_value < SIGNIFICANCE_THRESHOLD:
-                    print("  - Conclusion: The difference is statistically significant.")
-                else:
-                    print("  - Conclusion: The difference is not statistically significant.")
-            else:
-                print("  - Not enough data to perform t-test.")
+def print_significance_report(results, include_mann_whitney=True):
+    """Prints the per-population significance report for a compare_groups()-shaped result."""
+    print("\n--- Statistical Significance Report ---")
+    print(f"Comparing relative frequencies between responders and non-responders across all PBMC samples.")
+    tests = "Welch's t-test and the Mann-Whitney U test" if include_mann_whitney else "Welch's t-test"
+    print(f"Using {tests}, with {CORRECTION_METHOD} multiple-testing correction. "
+          f"Significance threshold p < {SIGNIFICANCE_THRESHOLD}.")
+
+    for row in results.itertuples(index=False):
         print("-" * 30)
+        print(f"Population: {row.population}")
+        if not math.isnan(row.t_pvalue):
+            print(f"  - P-value (Welch t-test): {row.t_pvalue:.4f}")
+            print(f"  - Adjusted p-value ({CORRECTION_METHOD}): {row.t_pvalue_adj:.4f}")
+            if include_mann_whitney:
+                print(f"  - P-value (Mann-Whitney U): {row.u_pvalue:.4f}")
+            if row.t_pvalue_adj < SIGNIFICANCE_THRESHOLD:
+                print("  - Conclusion: The difference is statistically significant.")
+            else:
+                print("  - Conclusion: The difference is not statistically significant.")
+        else:
+            print("  - Not enough data to perform t-test.")
+    print("-" * 30)
 
+def run_statistical_analysis(backend='sqlite', stats_mode='samples', chunksize=STREAM_CHUNK_SIZE):
+    """
+    Performs the main statistical analysis comparing cell frequencies
+    between responders and non-responders. (Corresponds to Part 3)
+
+    With stats_mode='moments', the t-tests are computed from per-group SQL
+    aggregates instead of per-sample rows, so memory doesn't grow with the
+    number of samples; the boxplot and Mann-Whitney test are skipped.
+    stats_mode='streaming' reads samples 'chunksize' rows at a time into
+    running moments and quantile sketches, for tables larger than memory; its
+    boxplot is drawn from the sketched quartiles and tail samples.
+    """
+    print("\n--- Starting Statistical Analysis (Part 3) ---")
+
+    try:
+        with span('run_statistical_analysis', backend=backend, stats_mode=stats_mode):
+            run_statistical_stages(backend, stats_mode, chunksize)
     except Exception as e:
         print(f"An error occurred during analysis: {e}")
     finally:
-        conn.close()
+        peak = peak_rss_mb()
+        if peak is not None:
+            print(f"Peak RSS so far: {peak:,.0f} MB")
+
+def run_statistical_stages(backend, stats_mode, chunksize):
+    """The stages of run_statistical_analysis, each timed as an instrumentation span."""
+    from hypothesis_tests import compare_groups, compare_moments, compare_summaries
+    from boxplots import compute_box_stats
+    if stats_mode not in STATS_MODES:
+        raise ValueError(f"Unknown statistics mode '{stats_mode}'. Expected one of {STATS_MODES}.")
+    if stats_mode == 'moments':
+        if backend != 'sqlite':
+            raise ValueError("The 'moments' statistics mode reads from SQLite only.")
+        with span('query') as stage:
+            responders, non_responders = load_response_moments()
+            stage.rows = int(responders[0][0] + non_responders[0][0])
+        print(f"Computed moments for {stage.rows} PBMC samples in SQL.")
+        print("Boxplot skipped: it needs per-sample values.")
+        with span('ttest', rows=stage.rows):
+            results = compare_moments(responders, non_responders, CELL_POPULATIONS, correction=CORRECTION_METHOD)
+        print_significance_report(results, include_mann_whitney=False)
+        return
+    if stats_mode == 'streaming':
+        if backend != 'sqlite':
+            raise ValueError("The 'streaming' statistics mode reads from SQLite only.")
+        with span('query', chunksize=chunksize) as stage:
+            responders, non_responders, stage.rows = stream_response_summaries(chunksize)
+        print(f"Streamed {stage.rows} PBMC samples in chunks of {chunksize}.")
+        with span('box_stats'):
+            summaries = {'yes': responders.box_stats(), 'no': non_responders.box_stats()}
+        print_box_summary(summaries)
+        plot_response_boxplot(summaries)
+        with span('ttest', rows=int(responders.stats.n[0] + non_responders.stats.n[0])):
+            results = compare_summaries(responders.summary_stats(), non_responders.summary_stats(),
+                                        CELL_POPULATIONS, correction=CORRECTION_METHOD)
+        print_significance_report(results, include_mann_whitney=False)
+        return
 
-def run_subset_analysis():
+    # This query selects the data for the main analysis.
+    # We are looking for all PBMC samples, regardless of condition or treatment initially.
+    with span('query', backend=backend) as stage:
+        df = load_columns(FREQUENCY_VIEW, STATISTICAL_COLUMNS, PBMC_FILTERS, FREQUENCY_DTYPES, backend)
+        stage.rows = len(df)
+    print(f"Loaded {len(df)} PBMC samples for analysis.")
+
+    # Split the wide frame once into a (samples x populations) array per response group;
+    # the plot and the tests both read these, and the frame itself is released
+    with span('split', rows=len(df)):
+        group_values = {
+            group: df.loc[df['response'] == group, CELL_POPULATIONS].to_numpy() for group in RESPONSE_GROUPS
+        }
+        del df
+    rows = sum(len(values) for values in group_values.values())
+
+    # --- Data Visualization (Boxplot) ---
+    with span('box_stats', rows=rows):
+        summaries = {group: compute_box_stats(values, CELL_POPULATIONS) for group, values in group_values.items()}
+    plot_response_boxplot(summaries)
+
+    # --- Statistical Significance Testing ---
+    # All populations are tested in one vectorized pass over (samples x populations) arrays
+    with span('ttest', rows=rows):
+        results = compare_groups(group_values['yes'], group_values['no'], CELL_POPULATIONS,
+                                 correction=CORRECTION_METHOD)
+    print_significance_report(results)
+
+def count_baseline_subjects(backend='sqlite'):
+    """
+    Counts unique baseline melanoma subjects overall and per project, response
+    and sex. On SQLite this is a handful of COUNT(DISTINCT) queries, so no
+    DataFrame (or pandas import) is needed; the Parquet backend groups in pandas.
+    Returns (total, {column: [(value, count), ...]}).
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}'. Expected one of {BACKENDS}.")
+    if backend == 'sqlite':
+        with span('query', backend=backend):
+            return subject_counts(SUBSET_GROUP_COLUMNS, **BASELINE_MELANOMA_FILTERS)
+    with span('query', backend=backend) as stage:
+        df = load_columns(TABLE_NAME, SUBSET_COLUMNS, BASELINE_MELANOMA_FILTERS, COLUMN_DTYPES, backend)
+        stage.rows = len(df)
+    counts = {
+        column: [(value, int(count)) for value, count in
+                 df.groupby(column, observed=True)['subject_id'].nunique().items()]
+        for column in SUBSET_GROUP_COLUMNS
+    }
+    return df['subject_id'].nunique(), counts
+
+def format_table(headers, rows):
+    """Formats rows as right-aligned text columns, the layout of DataFrame.to_string(index=False)."""
+    widths = [max([len(str(header))] + [len(str(row[i])) for row in rows]) for i, header in enumerate(headers)]
+    lines = [headers] + list(rows)
+    return "\n".join("  ".join(str(value).rjust(width) for value, width in zip(line, widths)) for line in lines)
+
+def run_subset_analysis(backend='sqlite'):
     """
     Runs a descriptive analysis on a specific subset of the data. (Corresponds to Part 4)
     """
     print("\n--- Starting Data Subset Analysis (Part 4) ---")
-    conn = get_db_connection()
 
     try:
         # Query for baseline melanoma samples
-        query = f"SELECT * FROM {TABLE_NAME} WHERE condition = 'melanoma' AND time = 0"
-        df = pd.read_sql_query(query, conn)
-        print(f"Identified {len(df.subject_id.unique())} unique subjects from baseline melanoma samples.")
+        # Memoized per database content version, since the same cohort is rerun all day
+        cache_key = {'view': TABLE_NAME, 'columns': SUBSET_GROUP_COLUMNS,
+                     'filters': normalize_filters(BASELINE_MELANOMA_FILTERS), 'backend': backend}
+        with span('run_subset_analysis', backend=backend):
+            total, counts = get_cache(DB_FILE).get_or_compute(
+                'subject_counts', cache_key, lambda: count_baseline_subjects(backend))
+        print(f"Identified {total} unique subjects from baseline melanoma samples.")
 
         print("\n--- Summary of the Baseline Melanoma Cohort ---")
 
-        project_counts = df.groupby('project')['subject_id'].nunique().reset_index(name='sample_count')
         print("\n1. Sample Count per Project:")
-        print(project_counts.to_string(index=False))
+        print(format_table(['project', 'sample_count'], counts['project']))
 
-        response_counts = df.groupby('response')['subject_id'].nunique().reset_index(name='unique_subject_count')
         print("\n2. Subject Count by Response Status:")
-        print(response_counts.to_string(index=False))
-        
-        sex_counts = df.groupby('sex')['subject_id'].nunique().reset_index(name='unique_subject_count')
+        print(format_table(['response', 'unique_subject_count'], counts['response']))
+
         print("\n3. Subject Count by Sex:")
-        print(sex_counts.to_string(index=False))
+        print(format_table(['sex', 'unique_subject_count'], counts['sex']))
 
         print("\nAnalysis complete.")
 
     except Exception as e:
         print(f"An error occurred during subset analysis: {e}")
-    finally:
-        conn.close()
 
 # --- Main execution block ---
+def main(argv=None, parts=ANALYSIS_PARTS):
+    """
+    Command-line entry point; also run by `python cli.py analyze` (both parts),
+    `cli.py subset` and `cli.py stats`.
+    """
+    parser = argparse.ArgumentParser(description="Run the cell-count analyses.")
+    parser.add_argument('--backend', choices=BACKENDS, default='sqlite',
+                        help="Read from the SQLite database or its Parquet copy (default: sqlite).")
+    if 'stats' in parts:
+        parser.add_argument('--stats', choices=STATS_MODES, default='samples',
+                            help="Test per-sample values or per-group SQL moments (default: samples).")
+        parser.add_argument('--chunksize', type=int, default=STREAM_CHUNK_SIZE,
+                            help=f"Rows per chunk for --stats streaming (default: {STREAM_CHUNK_SIZE}).")
+    args = parser.parse_args(argv)
+    if 'subset' in parts:
+        run_subset_analysis(args.backend)
+    if 'stats' in parts:
+        run_statistical_analysis(args.backend, args.stats, args.chunksize)
+
 if __name__ == "__main__":
-    run_subset_analysis()
-    run_statistical_analysis()
+    main()
@@ -0,0 +1,69 @@
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+# --- Configuration ---
+# Text-only subcommands that should start without loading the scientific stack
+TEXT_COMMANDS = ['subset', 'avg-b-cells', 'check-plans']
+STARTUP_BUDGET_MS = 150
+REPEATS = 5
+# Top-level packages whose import would blow the budget on their own
+HEAVY_MODULES = ['numpy', 'pandas', 'scipy', 'matplotlib', 'seaborn', 'pyarrow', 'adbc_driver_sqlite']
+
+def run_once(command):
+    """
+    Runs `python -X importtime cli.py COMMAND` in a fresh interpreter. Returns the
+    wall time in ms and {heavy top-level module: cumulative import time in ms}.
+    """
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', 'cli.py', command],
+                            capture_output=True, text=True, check=True)
+    elapsed = (time.perf_counter() - start) * 1000
+
+    heavy = {}
+    for line in result.stderr.splitlines():
+        # Format: "import time: self [us] | cumulative | <indent>package"
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line.split('|')
+        name = name.strip()
+        if name in HEAVY_MODULES:
+            heavy[name] = int(cumulative) / 1000
+    return elapsed, heavy
+
+def bench_startup(commands=TEXT_COMMANDS, repeats=REPEATS, budget_ms=STARTUP_BUDGET_MS):
+    """
+    Times each command's cold start (median of 'repeats' fresh interpreters) and
+    lists any heavy module it imported. Returns True if all are within budget.
+    """
+    within_budget = True
+    for command in commands:
+        timings = []
+        heavy = {}
+        for _ in range(repeats):
+            elapsed, heavy = run_once(command)
+            timings.append(elapsed)
+        median = statistics.median(timings)
+        status = "OK" if median <= budget_ms else "SLOW"
+        print(f"[{status}] cli.py {command}: median {median:.0f} ms, min {min(timings):.0f} ms "
+              f"(budget {budget_ms} ms)")
+        for name, ms in heavy.items():
+            print(f"    imports {name} ({ms:.0f} ms)")
+        within_budget = within_budget and median <= budget_ms
+    return within_budget
+
+def main(argv=None):
+    """Command-line entry point; also run by `python cli.py bench-startup`. Returns the exit status."""
+    parser = argparse.ArgumentParser(description="Time cold starts of the text-only subcommands.")
+    parser.add_argument('--repeats', type=int, default=REPEATS,
+                        help=f"Fresh interpreters per command (default: {REPEATS}).")
+    parser.add_argument('--budget', type=float, default=STARTUP_BUDGET_MS,
+                        help=f"Maximum median wall time in ms (default: {STARTUP_BUDGET_MS}).")
+    args = parser.parse_args(argv)
+    return 0 if bench_startup(TEXT_COMMANDS, args.repeats, args.budget) else 1
+
+# --- Main execution block ---
+if __name__ == "__main__":
+    sys.exit(main())
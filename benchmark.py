@@ -0,0 +1,171 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+from generate_data import generate_csv, parse_rows
+
+# --- Configuration ---
+BENCH_DIR = "benchmarks"
+# Generated CSVs are kept here and reused by later runs with the same size and seed
+DATA_DIR = os.path.join(BENCH_DIR, "data")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+# Scratch directory the pipeline runs in, so the benchmark never touches ./cell_counts.db
+WORK_DIR = os.path.join(BENCH_DIR, "work")
+REPEATS = 3
+INGEST_CHUNK_SIZE = 100_000
+# A stage whose median is this many times the baseline's counts as a regression
+REGRESSION_THRESHOLD = 1.25
+
+def git_commit():
+    """Returns the current git commit hash, or None outside a git checkout."""
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def time_stage(fn, repeats, before=None):
+    """
+    Calls fn() 'repeats' times with its output suppressed, calling before() (e.g.
+    to clear result caches) ahead of each run. Returns the wall times in seconds.
+    """
+    timings = []
+    for _ in range(repeats):
+        if before is not None:
+            before()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+    return timings
+
+def summarize(timings, **extra):
+    return {'runs_s': timings, 'min_s': min(timings), 'median_s': statistics.median(timings), **extra}
+
+def run_benchmarks(csv_file, repeats=REPEATS):
+    """
+    Loads csv_file into a fresh database in WORK_DIR and times ingest, each
+    analysis and calculate_avg_b_cells. Result caches are cleared before every
+    run, so each timing includes the database work. Returns {stage: summary}.
+    """
+    csv_file = os.path.abspath(csv_file)
+    os.makedirs(WORK_DIR, exist_ok=True)
+    previous_dir = os.getcwd()
+    os.chdir(WORK_DIR)
+    try:
+        # The pipeline reads ./cell-count.csv and writes ./cell_counts.db relative to the working directory
+        if os.path.lexists('cell-count.csv'):
+            os.remove('cell-count.csv')
+        os.symlink(csv_file, 'cell-count.csv')
+
+        import load_data
+        import analysis
+        import part4_query
+        from query_cache import get_cache
+
+        stages = {}
+        print(f"Benchmarking ingest of {csv_file} ...")
+        ingest = time_stage(lambda: load_data.create_database(chunksize=INGEST_CHUNK_SIZE), 1)
+        with analysis.get_db_connection() as conn:
+            rows = conn.execute(f"SELECT COUNT(*) FROM {analysis.TABLE_NAME}").fetchone()[0]
+        if not rows:
+            raise RuntimeError("Ingest loaded no rows; run `python load_data.py` in the work directory to see why.")
+        stages['ingest'] = summarize(ingest, rows=rows, rows_per_s=rows / ingest[0])
+
+        cache = get_cache(analysis.DB_FILE)
+        functions = {
+            'run_subset_analysis': analysis.run_subset_analysis,
+            'run_statistical_analysis': analysis.run_statistical_analysis,
+            'run_statistical_analysis[moments]': lambda: analysis.run_statistical_analysis(stats_mode='moments'),
+            'run_statistical_analysis[streaming]': lambda: analysis.run_statistical_analysis(stats_mode='streaming'),
+            'calculate_avg_b_cells': part4_query.calculate_avg_b_cells,
+        }
+        for name, fn in functions.items():
+            print(f"Benchmarking {name} ...")
+            stages[name] = summarize(time_stage(fn, repeats, before=cache.clear))
+        return stages
+    finally:
+        os.chdir(previous_dir)
+
+def compare_results(current, baseline, threshold=REGRESSION_THRESHOLD):
+    """
+    Prints each stage's median against a baseline result. Returns the names of
+    stages that got slower by more than 'threshold' times.
+    """
+    print(f"\n--- Comparison with baseline ({baseline.get('git_commit') or 'unknown commit'}) ---")
+    regressions = []
+    for name, stage in current['stages'].items():
+        old = baseline['stages'].get(name)
+        if old is None:
+            print(f"{name:<38} {stage['median_s'] * 1000:>10.1f} ms  (new stage)")
+            continue
+        ratio = stage['median_s'] / max(old['median_s'], 1e-9)
+        flag = "  REGRESSION" if ratio > threshold else ""
+        print(f"{name:<38} {old['median_s'] * 1000:>10.1f} ms -> {stage['median_s'] * 1000:>10.1f} ms  x{ratio:.2f}{flag}")
+        if ratio > threshold:
+            regressions.append(name)
+    return regressions
+
+def main(argv=None):
+    """Command-line entry point; also run by `python cli.py benchmark`. Returns the exit status."""
+    parser = argparse.ArgumentParser(description="Benchmark ingest and the analyses on synthetic data.")
+    parser.add_argument('--rows', default='1m', help="Row count, or one of 1m/10m/100m (default: 1m).")
+    parser.add_argument('--seed', type=int, default=0, help="Generator seed (default: 0).")
+    parser.add_argument('--csv', default=None, help="Benchmark an existing CSV instead of generating one.")
+    parser.add_argument('--repeats', type=int, default=REPEATS,
+                        help=f"Runs per analysis stage (default: {REPEATS}).")
+    parser.add_argument('--output', default=None,
+                        help=f"Result JSON path (default: {RESULTS_DIR}/<rows>-<timestamp>.json).")
+    parser.add_argument('--compare', metavar='BASELINE_JSON', default=None,
+                        help="Compare against an earlier result; exits non-zero on a regression.")
+    args = parser.parse_args(argv)
+
+    csv_file = args.csv
+    if csv_file is None:
+        os.makedirs(DATA_DIR, exist_ok=True)
+        csv_file = os.path.join(DATA_DIR, f"synthetic-{args.rows.lower()}-seed{args.seed}.csv")
+        if not os.path.exists(csv_file):
+            generate_csv(csv_file, parse_rows(args.rows), args.seed)
+
+    created_at = datetime.now(timezone.utc)
+    result = {
+        'created_at': created_at.isoformat(),
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'dataset': {'csv': csv_file, 'rows': args.rows if args.csv is None else None,
+                    'seed': args.seed if args.csv is None else None},
+        'repeats': args.repeats,
+        'stages': run_benchmarks(csv_file, args.repeats),
+    }
+
+    print("\n--- Benchmark Results (median of runs) ---")
+    for name, stage in result['stages'].items():
+        print(f"{name:<38} {stage['median_s'] * 1000:>10.1f} ms")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{args.rows.lower()}-{created_at:%Y%m%dT%H%M%S}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f"\nResults saved to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare_results(result, json.load(f))
+        if regressions:
+            print(f"Regressions: {', '.join(regressions)}")
+            return 1
+    return 0
+
+# --- Main execution block ---
+if __name__ == "__main__":
+    sys.exit(main())
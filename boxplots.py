@@ -0,0 +1,93 @@
+import numpy as np
+
+from instrumentation import span
+from streaming_stats import WHISKER_RANGE
+
+# --- Configuration ---
+# Figures are only ever saved to files, so no GUI backend (or its import cost) is needed
+MPL_BACKEND = 'Agg'
+# Outlier points drawn per box; more are thinned evenly so drawing cost doesn't grow with the data
+MAX_FLIERS = 200
+# Colors per hue level, matching seaborn's default palette
+GROUP_COLORS = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728']
+# Share of each category slot taken up by its boxes
+GROUP_WIDTH = 0.8
+
+def thin_fliers(fliers, max_fliers=MAX_FLIERS):
+    """Keeps at most max_fliers outliers, evenly spaced through their sorted order (extremes included)."""
+    fliers = np.sort(np.asarray(fliers, dtype=float))
+    if len(fliers) <= max_fliers:
+        return fliers
+    return fliers[np.linspace(0, len(fliers) - 1, max_fliers).round().astype(int)]
+
+def compute_box_stats(values, populations, whisker_range=WHISKER_RANGE, max_fliers=MAX_FLIERS):
+    """
+    Exact boxplot summaries for every column of a (samples x populations) array:
+    quartiles, median, Tukey whiskers (the most extreme values within 1.5 IQR of
+    the box) and a thinned sample of outliers. Columns are summarized one at a
+    time in their own dtype, so temporaries are one column wide.
+    Returns {population: stats dict} in the format matplotlib's bxp() takes.
+    """
+    summaries = {}
+    for i, pop in enumerate(populations):
+        column = values[:, i]
+        column = column[~np.isnan(column)]
+        q1, median, q3 = np.percentile(column, [25, 50, 75]) if len(column) else (np.nan,) * 3
+        iqr = q3 - q1
+        low_fence, high_fence = q1 - whisker_range * iqr, q3 + whisker_range * iqr
+        outside = (column < low_fence) | (column > high_fence)
+        inside = column[~outside]
+        summaries[pop] = {
+            'q1': q1,
+            'med': median,
+            'q3': q3,
+            'whislo': inside.min() if len(inside) else np.nan,
+            'whishi': inside.max() if len(inside) else np.nan,
+            'fliers': thin_fliers(column[outside], max_fliers),
+            'n': len(column),
+        }
+    return summaries
+
+def draw_boxplot(summaries, populations, groups, output_filename, title, ylabel, xlabel,
+                 group_label='response'):
+    """
+    Draws grouped boxplots with matplotlib's bxp() from precomputed summaries
+    {group: {population: stats dict}}, e.g. from compute_box_stats() or the
+    streaming sketches. No raw samples are needed, so drawing time depends only
+    on the number of boxes. Groups are laid out side by side, as seaborn does for hue.
+    """
+    import matplotlib
+    matplotlib.use(MPL_BACKEND)
+    import matplotlib.pyplot as plt
+    from matplotlib.patches import Patch
+
+    fig, ax = plt.subplots(figsize=(12, 8))
+    box_width = GROUP_WIDTH / len(groups)
+    for j, group in enumerate(groups):
+        offset = (j - (len(groups) - 1) / 2) * box_width
+        color = GROUP_COLORS[j % len(GROUP_COLORS)]
+        ax.bxp(
+            [summaries[group][pop] for pop in populations],
+            positions=np.arange(len(populations)) + offset,
+            widths=box_width * 0.9,
+            patch_artist=True,
+            manage_ticks=False,
+            boxprops={'facecolor': color, 'edgecolor': '#3f3f3f'},
+            medianprops={'color': '#3f3f3f'},
+            whiskerprops={'color': '#3f3f3f'},
+            capprops={'color': '#3f3f3f'},
+            flierprops={'marker': 'o', 'markerfacecolor': 'none', 'markeredgecolor': '#3f3f3f'},
+        )
+
+    ax.set_xticks(np.arange(len(populations)))
+    ax.set_xticklabels(populations, rotation=45)
+    ax.set_xlim(-0.5, len(populations) - 0.5)
+    ax.set_title(title)
+    ax.set_ylabel(ylabel)
+    ax.set_xlabel(xlabel)
+    ax.legend(handles=[Patch(facecolor=GROUP_COLORS[j % len(GROUP_COLORS)], edgecolor='#3f3f3f', label=group)
+                       for j, group in enumerate(groups)], title=group_label)
+    fig.tight_layout()
+    with span('savefig'):
+        fig.savefig(output_filename)
+    plt.close(fig)
@@ -0,0 +1,58 @@
+import argparse
+import sqlite3
+import sys
+
+from analysis import DB_FILE, PBMC_QUERY, PBMC_PARAMS, SUBSET_QUERIES
+from part4_query import AVG_B_CELLS_QUERY, AVG_B_CELLS_PARAMS
+
+# --- Configuration ---
+# Each entry is (sql, params)
+SHIPPED_QUERIES = {
+    'run_statistical_analysis': (PBMC_QUERY, PBMC_PARAMS),
+    **{f"run_subset_analysis ({column or 'total'})": query for column, query in SUBSET_QUERIES.items()},
+    'calculate_avg_b_cells': (AVG_B_CELLS_QUERY, AVG_B_CELLS_PARAMS),
+}
+# Table aliases a query may scan because it reads most of the table anyway. The Part 3
+# query reads every PBMC sample (about 70% of them); since enum columns are stored as
+# integer codes, a scan of 'samples' beats the index (1.22 s vs 1.41 s at 1M rows).
+ALLOWED_SCANS = {'run_statistical_analysis': ['sa']}
+
+def full_scans(conn, query, params=(), allowed=()):
+    """
+    Runs EXPLAIN QUERY PLAN and returns the plan steps that scan a table
+    without an index, other than scans of the 'allowed' aliases. An empty
+    list means the query is fully index-served.
+    """
+    plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params)]
+    allowed_steps = {f"SCAN {alias}" for alias in allowed}
+    return plan, [step for step in plan
+                  if step.startswith('SCAN') and 'INDEX' not in step and step not in allowed_steps]
+
+def check_query_plans():
+    """
+    Verifies that every query shipped in analysis.py and part4_query.py is
+    served by an index. Returns True if all of them are.
+    """
+    conn = sqlite3.connect(DB_FILE)
+    all_indexed = True
+    try:
+        for name, (query, params) in SHIPPED_QUERIES.items():
+            plan, scans = full_scans(conn, query, params, ALLOWED_SCANS.get(name, ()))
+            status = "OK" if not scans else "FULL SCAN"
+            print(f"[{status}] {name}")
+            for step in plan:
+                print(f"    {step}")
+            all_indexed = all_indexed and not scans
+    finally:
+        conn.close()
+    return all_indexed
+
+# --- Main execution block ---
+def main(argv=None):
+    """Command-line entry point; also run by `python cli.py check-plans`. Returns the exit status."""
+    parser = argparse.ArgumentParser(description="Verify the shipped queries are index-served.")
+    parser.parse_args(argv)
+    return 0 if check_query_plans() else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
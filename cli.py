@@ -0,0 +1,50 @@
+import argparse
+import importlib
+import sys
+
+from instrumentation import PROFILE_DIR, configure
+
+# --- Configuration ---
+# Subcommand -> (module, keyword arguments for its main(), description). A module is only
+# imported when its subcommand runs, so text-only commands never load pandas or matplotlib.
+COMMANDS = {
+    'load': ('load_data', {}, "Load cell-count.csv into the SQLite database"),
+    'analyze': ('analysis', {}, "Run the subset and statistical analyses"),
+    'subset': ('analysis', {'parts': ['subset']}, "Summarize the baseline melanoma cohort (text only)"),
+    'stats': ('analysis', {'parts': ['stats']}, "Compare responders and non-responders (boxplot and tests)"),
+    'avg-b-cells': ('part4_query', {}, "Average B cells for melanoma male responders at baseline"),
+    'check-plans': ('check_query_plans', {}, "Verify the shipped queries are index-served"),
+    'load-test': ('query_service', {}, "Load-test the async query service"),
+    'generate': ('generate_data', {}, "Write a seeded synthetic cell-count CSV"),
+    'benchmark': ('benchmark', {}, "Benchmark ingest and the analyses on synthetic data"),
+    'bench-startup': ('bench_startup', {}, "Time cold starts of the text-only subcommands"),
+}
+
+def main(argv=None):
+    """
+    Single entry point for every script: `python cli.py COMMAND [ARGS...]`.
+    ARGS are passed through to the command, e.g. `python cli.py stats --stats moments`.
+    Returns the command's exit status.
+    """
+    commands = "\n".join(f"  {name:<14} {description}" for name, (_, _, description) in COMMANDS.items())
+    parser = argparse.ArgumentParser(
+        description="Cell-count analysis toolkit.",
+        epilog=f"commands:\n{commands}\n\nRun `python cli.py COMMAND --help` for a command's options.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('--trace', metavar='PATH', default=None,
+                        help="Write per-stage timing spans as JSON lines to PATH ('-' for stderr).")
+    parser.add_argument('--profile', metavar='SPANS', default=None,
+                        help=f"Run these comma-separated spans (or 'all') under cProfile; "
+                             f"stats go to {PROFILE_DIR}/.")
+    parser.add_argument('command', choices=COMMANDS, metavar='COMMAND', help="Command to run (see below).")
+    parser.add_argument('args', nargs=argparse.REMAINDER, help="Arguments passed to the command.")
+    args = parser.parse_args(argv)
+
+    configure(trace=args.trace, profile=args.profile)
+    module_name, kwargs, _ = COMMANDS[args.command]
+    return importlib.import_module(module_name).main(args.args, **kwargs)
+
+# --- Main execution block ---
+if __name__ == "__main__":
+    sys.exit(main())
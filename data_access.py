@@ -0,0 +1,257 @@
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from schema import DB_FILE
+
+# ADBC returns query results as Arrow columns built in C, with no per-row Python objects.
+# Both are optional; without them every function here falls back to the sqlite3 module.
+# They (and pandas) are imported on first use, so scalar lookups start without loading them.
+pa = None
+pc = None
+adbc_sqlite = None
+_arrow_imported = False
+
+# --- Configuration ---
+POOL_SIZE = 8
+# Per-connection tuning for pooled readers
+CACHED_STATEMENTS = 256             # prepared statements kept per connection
+MMAP_SIZE = 256 * 1024 * 1024       # bytes of the database file memory-mapped
+CACHE_SIZE = -64 * 1024             # page cache; negative means KiB (64 MiB)
+
+def _import_arrow():
+    """Imports pyarrow and the ADBC SQLite driver once, leaving either as None if it isn't installed."""
+    global pa, pc, adbc_sqlite, _arrow_imported
+    if _arrow_imported:
+        return
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+    except ImportError:
+        pa = None
+    try:
+        import adbc_driver_sqlite.dbapi as adbc_sqlite
+    except ImportError:
+        adbc_sqlite = None
+    _arrow_imported = True
+
+def arrow_fallback_errors():
+    """Errors raised when ADBC can't type a column, e.g. a TEXT column whose first batch is all NULL."""
+    _import_arrow()
+    return (OSError,) + ((adbc_sqlite.Error,) if adbc_sqlite else ())
+
+def open_read_connection(db_file=DB_FILE):
+    """
+    Opens a read-only sqlite3 connection tuned for analysis queries. load_data.py
+    builds full loads in a staging file that is renamed into place, and runs
+    incremental loads in WAL mode, so readers never block on a load.
+    The connection may be used from any thread, but only by one at a time.
+    """
+    conn = sqlite3.connect(f"file:{db_file}?mode=ro", uri=True, check_same_thread=False,
+                           cached_statements=CACHED_STATEMENTS)
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    conn.execute(f"PRAGMA cache_size = {CACHE_SIZE}")
+    return conn
+
+def open_arrow_connection(db_file=DB_FILE):
+    """Opens an ADBC connection with the same tuning as open_read_connection."""
+    _import_arrow()
+    conn = adbc_sqlite.connect(db_file)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+        cursor.execute(f"PRAGMA cache_size = {CACHE_SIZE}")
+        cursor.execute("PRAGMA query_only = ON")
+    finally:
+        cursor.close()
+    return conn
+
+class ConnectionPool:
+    """
+    Thread-safe pool of reusable connections to one database file. At most
+    'size' connections are checked out at once; further callers wait. If the
+    database file is replaced (e.g. rebuilt by load_data.py), idle connections
+    to the old file are closed and new ones are opened on demand.
+    """
+
+    def __init__(self, db_file, factory, size=POOL_SIZE):
+        self.db_file = db_file
+        self.factory = factory
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._file_id = None
+
+    def _current_file_id(self):
+        stat = os.stat(self.db_file)
+        return stat.st_dev, stat.st_ino
+
+    def _checkout(self):
+        with self._lock:
+            file_id = self._current_file_id()
+            if file_id != self._file_id:
+                self._close_idle()
+                self._file_id = file_id
+        try:
+            return self._idle.get_nowait(), file_id
+        except queue.Empty:
+            return self.factory(self.db_file), file_id
+
+    def _close_idle(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+    @contextmanager
+    def connection(self):
+        """Borrows a connection for the duration of a with-block."""
+        self._slots.acquire()
+        try:
+            conn, file_id = self._checkout()
+            try:
+                yield conn
+            finally:
+                # Checked and returned under the lock, so a concurrent checkout that sees a
+                # replaced file can't close the idle connections between the two steps
+                with self._lock:
+                    if file_id == self._file_id:
+                        self._idle.put(conn)
+                    else:
+                        conn.close()
+        finally:
+            self._slots.release()
+
+    def close(self):
+        """Closes all idle connections."""
+        with self._lock:
+            self._close_idle()
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(db_file=DB_FILE, arrow=False):
+    """Returns the shared sqlite3 (or ADBC, if arrow=True) connection pool for a database file."""
+    key = (os.path.abspath(db_file), arrow)
+    with _pools_lock:
+        if key not in _pools:
+            factory = open_arrow_connection if arrow else open_read_connection
+            _pools[key] = ConnectionPool(db_file, factory)
+        return _pools[key]
+
+def arrow_available():
+    """Returns True if the columnar ADBC/Arrow path can be used."""
+    _import_arrow()
+    return pa is not None and adbc_sqlite is not None
+
+def fetch_arrow(query, params=(), db_file=DB_FILE):
+    """Runs a query through a pooled ADBC connection and returns the result as a pyarrow Table."""
+    with get_pool(db_file, arrow=True).connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(query, tuple(params))
+            return cursor.fetch_arrow_table()
+        finally:
+            cursor.close()
+
+def arrow_to_frame(table, dtypes=None):
+    """
+    Converts an Arrow table to a DataFrame with the requested dtypes. Categorical
+    columns are dictionary-encoded in Arrow first, so pandas never sees per-value
+    Python strings for them; numeric columns convert without copying where possible.
+    """
+    dtypes = dtypes or {}
+    for col, dtype in dtypes.items():
+        if dtype == 'category' and col in table.column_names:
+            index = table.column_names.index(col)
+            table = table.set_column(index, col, pc.dictionary_encode(table[col]))
+    df = sort_categories(table.to_pandas())
+    numeric = {col: dtype for col, dtype in dtypes.items() if dtype != 'category' and col in df}
+    return df.astype(numeric) if numeric else df
+
+def sort_categories(df):
+    """
+    Orders the categories of every categorical column lexically, as astype('category')
+    does. Arrow dictionaries keep first-seen order, which would otherwise leak into
+    groupby and plot ordering.
+    """
+    for col in df.select_dtypes('category'):
+        df[col] = df[col].cat.reorder_categories(sorted(df[col].cat.categories))
+    return df
+
+def read_frame(query, params=(), dtypes=None, db_file=DB_FILE):
+    """
+    Runs a query and returns a DataFrame with the requested dtypes. Uses the
+    columnar Arrow path when ADBC is installed and falls back to
+    pd.read_sql_query otherwise (or if ADBC can't infer a column's type).
+    """
+    if arrow_available():
+        try:
+            return arrow_to_frame(fetch_arrow(query, params, db_file), dtypes)
+        except arrow_fallback_errors():
+            pass
+    import pandas as pd
+    with get_pool(db_file).connection() as conn:
+        return pd.read_sql_query(query, conn, params=list(params), dtype=dtypes)
+
+def iter_arrow_batches(query, schema, chunksize, db_file=DB_FILE, use_arrow=True):
+    """
+    Yields a query's result as pyarrow Tables of roughly 'chunksize' rows cast to
+    'schema'. Batches come straight from ADBC when available; otherwise they are
+    built from pandas chunks. An ADBC typing error can surface mid-stream, so
+    callers that write as they go should retry with use_arrow=False.
+    """
+    if use_arrow and arrow_available():
+        conn = adbc_sqlite.connect(db_file)
+        cursor = conn.cursor()
+        try:
+            cursor.adbc_statement.set_options(**{'adbc.sqlite.query.batch_rows': str(chunksize)})
+            cursor.execute(query)
+            for batch in cursor.fetch_record_batch():
+                yield pa.Table.from_batches([batch]).cast(schema)
+        finally:
+            cursor.close()
+            conn.close()
+        return
+
+    _import_arrow()
+    if pa is None:
+        raise ImportError("Arrow batches require pyarrow (pip install pyarrow).")
+    import pandas as pd
+    conn = sqlite3.connect(db_file)
+    try:
+        for chunk in pd.read_sql_query(query, conn, chunksize=chunksize):
+            yield pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+    finally:
+        conn.close()
+
+def iter_frames(query, params=(), chunksize=100_000, dtypes=None, db_file=DB_FILE):
+    """
+    Yields a query's result as DataFrames of at most 'chunksize' rows, holding
+    a pooled connection until the generator is exhausted or closed. Memory is
+    bounded by one chunk, however large the result is.
+    """
+    import pandas as pd
+    with get_pool(db_file).connection() as conn:
+        yield from pd.read_sql_query(query, conn, params=list(params), chunksize=chunksize, dtype=dtypes)
+
+def fetch_scalar(query, params=(), conn=None, db_file=DB_FILE):
+    """
+    Runs a single-value query (e.g. an aggregate) and returns the value. A scalar
+    has no per-row conversion cost, so this uses sqlite3 directly. Without an
+    explicit connection, one is borrowed from the shared pool.
+    """
+    if conn is not None:
+        return conn.execute(query, list(params)).fetchone()[0]
+    with get_pool(db_file).connection() as conn:
+        return conn.execute(query, list(params)).fetchone()[0]
+
+def fetch_all(query, params=(), conn=None, db_file=DB_FILE):
+    """Runs a small query (e.g. grouped aggregates) and returns its rows as tuples."""
+    if conn is not None:
+        return conn.execute(query, list(params)).fetchall()
+    with get_pool(db_file).connection() as conn:
+        return conn.execute(query, list(params)).fetchall()
@@ -0,0 +1,111 @@
+import argparse
+import csv
+import time
+
+import numpy as np
+import pandas as pd
+
+from schema import CELL_POPULATIONS
+
+# --- Configuration ---
+# Named sizes for benchmarks; any row count can be passed instead
+SIZES = {'1m': 1_000_000, '10m': 10_000_000, '100m': 100_000_000}
+# Subjects generated (and written) per chunk, so memory stays flat at any size
+CHUNK_SUBJECTS = 100_000
+
+# Distributions measured on cell-count.csv. Every subject has one sample per
+# time point, and project, condition, sex, age, treatment, response and sample
+# type are fixed per subject.
+PROJECTS = {'prj1': 3 / 7, 'prj2': 2 / 7, 'prj3': 2 / 7}
+CONDITIONS = {'melanoma': 0.493, 'carcinoma': 0.372, 'healthy': 0.135}
+TREATMENTS = ['miraclib', 'phauximab']  # healthy subjects get 'none' and no response
+SEX_MALE_SHARE = 0.517
+AGE_RANGE = (50, 79)
+PBMC_SHARE = 5 / 7                      # remaining subjects are sampled from whole blood (WB)
+RESPONDER_SHARE = 0.5
+TIMES = [0, 7, 14]
+COUNT_MEANS = {'b_cell': 9900, 'cd8_t_cell': 24650, 'cd4_t_cell': 29550, 'nk_cell': 14750, 'monocyte': 19800}
+COUNT_STDS = {'b_cell': 3170, 'cd8_t_cell': 4730, 'cd4_t_cell': 5270, 'nk_cell': 3840, 'monocyte': 4390}
+# Multiplier on responders' mean counts, reproducing the differences in the real data
+RESPONDER_EFFECT = {'b_cell': 1.0, 'cd8_t_cell': 1.027, 'cd4_t_cell': 1.059, 'nk_cell': 1.031, 'monocyte': 1.032}
+
+COLUMNS = ['project', 'subject', 'condition', 'age', 'sex', 'treatment', 'response', 'sample',
+           'sample_type', 'time_from_treatment_start'] + CELL_POPULATIONS
+
+def parse_rows(value):
+    """Parses a row count given as a named size ('10m') or an integer."""
+    return SIZES.get(value.lower()) or int(value)
+
+def generate_chunk(rng, first_subject, n_subjects, subject_width, sample_width):
+    """
+    Generates the rows for subjects first_subject .. first_subject + n_subjects - 1
+    as a DataFrame with cell-count.csv's columns. Rows are ordered by subject,
+    then time, as in the original export.
+    """
+    choice = lambda options, size: rng.choice(list(options), size=size, p=list(options.values()))
+    condition = choice(CONDITIONS, n_subjects)
+    healthy = condition == 'healthy'
+    treatment = np.where(healthy, 'none', rng.choice(TREATMENTS, size=n_subjects))
+    responder = rng.random(n_subjects) < RESPONDER_SHARE
+    response = np.where(healthy, None, np.where(responder, 'yes', 'no'))
+    subjects = pd.DataFrame({
+        'project': choice(PROJECTS, n_subjects),
+        'subject': 'sbj' + pd.Series(np.arange(first_subject, first_subject + n_subjects)).astype(str).str.zfill(subject_width),
+        'condition': condition,
+        'age': rng.integers(AGE_RANGE[0], AGE_RANGE[1] + 1, size=n_subjects),
+        'sex': np.where(rng.random(n_subjects) < SEX_MALE_SHARE, 'M', 'F'),
+        'treatment': treatment,
+        'response': response,
+        'sample_type': np.where(rng.random(n_subjects) < PBMC_SHARE, 'PBMC', 'WB'),
+    })
+
+    # One row per subject and time point
+    rows = subjects.loc[subjects.index.repeat(len(TIMES))].reset_index(drop=True)
+    n_rows = len(rows)
+    first_sample = first_subject * len(TIMES)
+    rows['sample'] = 'sample' + pd.Series(np.arange(first_sample, first_sample + n_rows)).astype(str).str.zfill(sample_width)
+    rows['time_from_treatment_start'] = np.tile(TIMES, n_subjects)
+    row_responder = np.repeat(responder & ~healthy, len(TIMES))
+    for pop in CELL_POPULATIONS:
+        mean = np.where(row_responder, COUNT_MEANS[pop] * RESPONDER_EFFECT[pop], COUNT_MEANS[pop])
+        counts = rng.normal(mean, COUNT_STDS[pop])
+        rows[pop] = np.clip(np.rint(counts), 0, None).astype(np.int64)
+    return rows[COLUMNS]
+
+def generate_csv(output_file, n_rows, seed=0, chunk_subjects=CHUNK_SUBJECTS):
+    """
+    Writes a synthetic cell-count CSV with about n_rows rows (rounded up to whole
+    subjects) to output_file. The same seed and chunk size always produce the
+    same file. Returns the number of rows written.
+    """
+    n_subjects = -(-n_rows // len(TIMES))
+    subject_width = max(3, len(str(n_subjects - 1)))
+    sample_width = max(5, len(str(n_subjects * len(TIMES) - 1)))
+    rng = np.random.default_rng(seed)
+
+    start = time.perf_counter()
+    written = 0
+    for first_subject in range(0, n_subjects, chunk_subjects):
+        chunk = generate_chunk(rng, first_subject, min(chunk_subjects, n_subjects - first_subject),
+                               subject_width, sample_width)
+        chunk.to_csv(output_file, mode='w' if written == 0 else 'a', header=written == 0,
+                     index=False, quoting=csv.QUOTE_MINIMAL)
+        written += len(chunk)
+    elapsed = time.perf_counter() - start
+    print(f"Wrote {written:,} rows ({n_subjects:,} subjects) to {output_file} in {elapsed:.1f}s.")
+    return written
+
+def main(argv=None):
+    """Command-line entry point; also run by `python cli.py generate`."""
+    parser = argparse.ArgumentParser(description="Generate a seeded synthetic cell-count CSV.")
+    parser.add_argument('--rows', default='1m',
+                        help=f"Row count, or one of {list(SIZES)} (default: 1m).")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed (default: 0).")
+    parser.add_argument('--output', default=None,
+                        help="Output CSV path (default: synthetic-<rows>.csv).")
+    args = parser.parse_args(argv)
+    generate_csv(args.output or f"synthetic-{args.rows.lower()}.csv", parse_rows(args.rows), args.seed)
+
+# --- Main execution block ---
+if __name__ == "__main__":
+    main()
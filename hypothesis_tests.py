@@ -0,0 +1,148 @@
+import numpy as np
+import pandas as pd
+from scipy.stats import ttest_ind, ttest_ind_from_stats, mannwhitneyu
+
+# --- Configuration ---
+CORRECTION_METHODS = ['bonferroni', 'bh']
+# Values per block of populations tested together; bounds temporary memory on large inputs
+BLOCK_ELEMENTS = 4_000_000
+
+def adjust_pvalues(p_values, method='bh'):
+    """
+    Corrects a 1-D array of p-values for multiple testing.
+    'bonferroni' controls the family-wise error rate; 'bh' (Benjamini-Hochberg)
+    controls the false discovery rate. NaN p-values are ignored and stay NaN.
+    """
+    if method not in CORRECTION_METHODS:
+        raise ValueError(f"Unknown correction method '{method}'. Expected one of {CORRECTION_METHODS}.")
+    p_values = np.asarray(p_values, dtype=float)
+    adjusted = np.full_like(p_values, np.nan)
+    valid = ~np.isnan(p_values)
+    p = p_values[valid]
+    m = len(p)
+    if m == 0:
+        return adjusted
+
+    if method == 'bonferroni':
+        adjusted[valid] = np.minimum(p * m, 1.0)
+    else:
+        # Step-up: scale each sorted p-value by m/rank, then enforce monotonicity from the top
+        order = np.argsort(p)
+        scaled = p[order] * m / np.arange(1, m + 1)
+        scaled = np.minimum.accumulate(scaled[::-1])[::-1]
+        result = np.empty(m)
+        result[order] = np.minimum(scaled, 1.0)
+        adjusted[valid] = result
+    return adjusted
+
+def compare_groups(group_a, group_b, populations, correction='bh', block_elements=BLOCK_ELEMENTS):
+    """
+    Tests every population at once for a difference between two groups.
+    group_a and group_b are 2-D arrays (samples x populations) with columns in
+    the order of 'populations'. Welch's t-test and the Mann-Whitney U test are
+    each computed in a vectorized call along axis 0, so hundreds of populations
+    cost no more Python overhead than one. Populations are processed in blocks
+    of about 'block_elements' values, keeping float64 and ranking temporaries
+    bounded when there are millions of samples; small inputs form a single block.
+
+    Returns a DataFrame with one row per population. Populations where either
+    group has fewer than two observations get NaN statistics.
+    """
+    group_a = np.asarray(group_a)
+    group_b = np.asarray(group_b)
+    n_a = len(group_a) - np.isnan(group_a).sum(axis=0)
+    n_b = len(group_b) - np.isnan(group_b).sum(axis=0)
+    testable = np.flatnonzero((n_a > 1) & (n_b > 1))
+
+    mean_a = np.full(len(populations), np.nan)
+    mean_b = np.full(len(populations), np.nan)
+    t_stat = np.full(len(populations), np.nan)
+    t_p = np.full(len(populations), np.nan)
+    u_stat = np.full(len(populations), np.nan)
+    u_p = np.full(len(populations), np.nan)
+    block_size = max(1, block_elements // max(1, len(group_a) + len(group_b)))
+    for start in range(0, len(testable), block_size):
+        columns = testable[start:start + block_size]
+        a, b = group_a[:, columns].astype(float), group_b[:, columns].astype(float)
+        # The 'omit' path copies and masks the data, so it is only taken when there are NaNs
+        nan_policy = 'omit' if np.isnan(a).any() or np.isnan(b).any() else 'propagate'
+        t_result = ttest_ind(a, b, axis=0, equal_var=False, nan_policy=nan_policy)
+        u_result = mannwhitneyu(a, b, axis=0, nan_policy=nan_policy)
+        mean_a[columns], mean_b[columns] = np.nanmean(a, axis=0), np.nanmean(b, axis=0)
+        t_stat[columns], t_p[columns] = t_result.statistic, t_result.pvalue
+        u_stat[columns], u_p[columns] = u_result.statistic, u_result.pvalue
+    # Untestable populations still report the means of whatever observations they have
+    for column in np.setdiff1d(np.arange(len(populations)), testable):
+        with np.errstate(invalid='ignore'):
+            mean_a[column] = np.nanmean(group_a[:, column]) if n_a[column] else np.nan
+            mean_b[column] = np.nanmean(group_b[:, column]) if n_b[column] else np.nan
+
+    return pd.DataFrame({
+        'population': populations,
+        'n_a': n_a,
+        'n_b': n_b,
+        'mean_a': mean_a,
+        'mean_b': mean_b,
+        't_stat': t_stat,
+        't_pvalue': t_p,
+        't_pvalue_adj': adjust_pvalues(t_p, correction),
+        'u_stat': u_stat,
+        'u_pvalue': u_p,
+        'u_pvalue_adj': adjust_pvalues(u_p, correction),
+    })
+
+def moments_to_stats(n, total, sum_squares):
+    """Converts per-population n, sum and sum of squares arrays into (mean, sample std)."""
+    n = np.asarray(n, dtype=float)
+    total = np.asarray(total, dtype=float)
+    sum_squares = np.asarray(sum_squares, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = total / n
+        variance = (sum_squares - total * mean) / (n - 1)
+    # Guard against tiny negative variances from floating-point cancellation
+    return mean, np.sqrt(np.clip(variance, 0, None))
+
+def compare_moments(moments_a, moments_b, populations, correction='bh'):
+    """
+    Welch's t-test for every population from sufficient statistics alone.
+    moments_a and moments_b are (n, sum, sum_of_squares) triples of arrays in
+    the order of 'populations', e.g. from a SQL GROUP BY, so memory is O(groups)
+    however many samples there are. The Mann-Whitney U test needs ranks, so its
+    columns are NaN. Returns a DataFrame shaped like compare_groups().
+    """
+    stats_a = (moments_a[0],) + moments_to_stats(*moments_a)
+    stats_b = (moments_b[0],) + moments_to_stats(*moments_b)
+    return compare_summaries(stats_a, stats_b, populations, correction)
+
+def compare_summaries(stats_a, stats_b, populations, correction='bh'):
+    """
+    Welch's t-test for every population from (n, mean, std) triples of arrays,
+    e.g. from compare_moments() or a streaming_stats.RunningStats accumulator.
+    Returns a DataFrame shaped like compare_groups(), with NaN Mann-Whitney columns.
+    """
+    n_a, mean_a, std_a = (np.asarray(x, dtype=float) for x in stats_a)
+    n_b, mean_b, std_b = (np.asarray(x, dtype=float) for x in stats_b)
+    testable = (n_a > 1) & (n_b > 1)
+
+    t_stat = np.full(len(populations), np.nan)
+    t_p = np.full(len(populations), np.nan)
+    if testable.any():
+        result = ttest_ind_from_stats(mean_a[testable], std_a[testable], n_a[testable],
+                                      mean_b[testable], std_b[testable], n_b[testable],
+                                      equal_var=False)
+        t_stat[testable], t_p[testable] = result.statistic, result.pvalue
+
+    nan = np.full(len(populations), np.nan)
+    return pd.DataFrame({
+        'population': populations,
+        'n_a': n_a.astype(int),
+        'n_b': n_b.astype(int),
+        'mean_a': mean_a,
+        'mean_b': mean_b,
+        't_stat': t_stat,
+        't_pvalue': t_p,
+        't_pvalue_adj': adjust_pvalues(t_p, correction),
+        'u_stat': nan,
+        'u_pvalue': nan,
+        'u_pvalue_adj': nan,
+    })
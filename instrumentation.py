@@ -0,0 +1,135 @@
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# --- Configuration ---
+# Where span records go as JSON lines: a file path, or '-' for stderr. Unset disables tracing.
+TRACE_ENV = "CELLCOUNT_TRACE"
+# Comma-separated span names to run under cProfile, or 'all'. Unset disables profiling.
+PROFILE_ENV = "CELLCOUNT_PROFILE"
+PROFILE_DIR = "profiles"
+
+_settings = {'trace': os.environ.get(TRACE_ENV), 'profile': os.environ.get(PROFILE_ENV)}
+_local = threading.local()
+_write_lock = threading.Lock()
+_profile_counter = 0
+
+def configure(trace=None, profile=None):
+    """
+    Turns tracing and profiling on from code or a CLI flag, overriding the
+    CELLCOUNT_TRACE / CELLCOUNT_PROFILE environment variables when given.
+    """
+    if trace is not None:
+        _settings['trace'] = trace
+    if profile is not None:
+        _settings['profile'] = profile
+
+def peak_rss_mb():
+    """Returns this process's peak resident set size in MB, or None where it can't be read."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def _profiled(name):
+    names = _settings['profile']
+    return bool(names) and (names == 'all' or name in names.split(','))
+
+def _write(record):
+    line = json.dumps(record, default=str)
+    with _write_lock:
+        if _settings['trace'] == '-':
+            print(line, file=sys.stderr, flush=True)
+        else:
+            with open(_settings['trace'], 'a') as f:
+                f.write(line + "\n")
+
+class Span:
+    """A timed pipeline stage. Set 'rows' inside the with-block once it is known."""
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.rows = None
+        self.attrs = attrs
+
+@contextmanager
+def span(name, rows=None, **attrs):
+    """
+    Times a pipeline stage: wall time, CPU time, rows processed and the process's
+    peak RSS at the end. With tracing on, one JSON line is written per span
+    (nested spans name their parent). If the stage is selected for profiling,
+    it runs under cProfile and the stats are dumped to PROFILE_DIR/<name>-<pid>-<n>.prof
+    for pstats or snakeviz. With both off, a span records nothing.
+
+        with span('ttest') as s:
+            results = compare_groups(...)
+            s.rows = len(samples)
+    """
+    current = Span(name, attrs)
+    current.rows = rows
+    tracing, profiling = bool(_settings['trace']), _profiled(name)
+    if not tracing and not profiling:
+        yield current
+        return
+
+    stack = _local.__dict__.setdefault('stack', [])
+    parent = stack[-1] if stack else None
+    stack.append(name)
+    profiler = None
+    # Only one profiler can run at a time; a nested stage is already covered by its parent's
+    if profiling and not getattr(_local, 'profiling', False):
+        import cProfile
+        profiler = cProfile.Profile()
+        _local.profiling = True
+    status, error = 'ok', None
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield current
+    except BaseException as e:
+        status, error = 'error', repr(e)
+        raise
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            _local.profiling = False
+        wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+        stack.pop()
+        profile_file = _dump_profile(profiler, name) if profiler is not None else None
+        if tracing:
+            record = {
+                'ts': datetime.now(timezone.utc).isoformat(),
+                'span': name,
+                'parent': parent,
+                'wall_s': round(wall, 6),
+                'cpu_s': round(cpu, 6),
+                'rows': current.rows,
+                'peak_rss_mb': peak_rss_mb(),
+                'pid': os.getpid(),
+                'status': status,
+                **current.attrs,
+            }
+            if error is not None:
+                record['error'] = error
+            if profile_file is not None:
+                record['profile'] = profile_file
+            _write(record)
+
+def _dump_profile(profiler, name):
+    global _profile_counter
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    with _write_lock:
+        _profile_counter += 1
+        path = os.path.join(PROFILE_DIR, f"{name}-{os.getpid()}-{_profile_counter}.prof")
+    profiler.dump_stats(path)
+    return path
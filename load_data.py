@@ -1,49 +1,714 @@
 import sqlite3
 import pandas as pd
 import os
+import time
+import argparse
+import hashlib
+import shutil
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import uuid
+from datetime import datetime, timezone
+
+from data_access import arrow_fallback_errors, iter_arrow_batches
+from instrumentation import span
+from schema import (CELL_POPULATIONS, CUBE_DIMENSIONS, CUBE_MEASURES, CUBE_TABLE, DB_FILE, ENUMS,
+                    FREQUENCY_TABLE, FREQUENCY_VIEW, INDEX_SQL, METADATA_TABLE, NULLABLE_COLUMNS, PARQUET_DIR,
+                    SCHEMA_SQL, TABLE_NAME, VIEW_COLUMNS, WATERMARK_TABLE, cube_schema_sql, enum_codes,
+                    enum_key)
 
 # --- Configuration ---
-DB_FILE = "cell_counts.db"
+# Table and column definitions live in schema.py
+# Full loads are built here, then renamed over DB_FILE once they validate
+STAGING_DB_FILE = DB_FILE + ".staging"
 CSV_FILE = "cell-count.csv"
+CHUNK_SIZE = 100_000
+# Settings for the one-transaction bulk load into a fresh database. There is nothing
+# to roll back to, so the rollback journal and fsyncs are skipped; 128 MiB of page
+# cache keeps the unique-key indexes in memory while rows are appended.
+BULK_LOAD_PRAGMAS = {'journal_mode': 'OFF', 'synchronous': 'OFF', 'cache_size': -131072, 'temp_store': 'MEMORY'}
+
+# Explicit dtypes so chunked reads don't re-infer types (and can't disagree) per chunk
+CSV_DTYPES = {
+    'project': 'object',
+    'subject': 'object',
+    'condition': 'object',
+    'age': 'int64',
+    'sex': 'object',
+    'treatment': 'object',
+    'response': 'object',
+    'sample': 'object',
+    'sample_type': 'object',
+    'time_from_treatment_start': 'int64',
+    'b_cell': 'int64',
+    'cd8_t_cell': 'int64',
+    'cd4_t_cell': 'int64',
+    'nk_cell': 'int64',
+    'monocyte': 'int64',
+}
+
+# Rename columns to be more database-friendly (no spaces, all lowercase)
+COLUMN_RENAMES = {
+    'subject': 'subject_id',
+    'time_from_treatment_start': 'time'
+}
 
-def create_database():
+# Database column names in CSV order; 'sample' is the natural key for incremental loads
+DB_COLUMNS = [COLUMN_RENAMES.get(col, col) for col in CSV_DTYPES]
+KEY_COLUMN = 'sample'
+# The Parquet copy (schema.PARQUET_DIR) is partitioned for directory-level pruning
+PARQUET_PARTITIONS = ['project', 'condition']
+
+def frequency_upsert_sql(source):
     """
-    Creates and populates the SQLite database from the CSV file.
-    A single denormalized table 'cell_counts' is created for simplicity.
+    Builds the statement that derives per-sample relative frequencies. 'source'
+    is a FROM clause exposing sample_pk and the raw population counts. Totals and
+    percentages are computed in the same single pass over the source rows.
+    """
+    counts = ", ".join(CELL_POPULATIONS)
+    total = " + ".join(CELL_POPULATIONS)
+    percentages = ", ".join(f"100.0 * {pop} / NULLIF(total_count, 0)" for pop in CELL_POPULATIONS)
+    updates = ", ".join(f"{col} = excluded.{col}" for col in ['total_count'] + CELL_POPULATIONS)
+    changed = " OR ".join(f"{col} IS NOT excluded.{col}" for col in ['total_count'] + CELL_POPULATIONS)
+    return f"""
+    INSERT INTO {FREQUENCY_TABLE} (sample_pk, total_count, {counts})
+    SELECT sample_pk, total_count, {percentages}
+    FROM (SELECT sample_pk, {counts}, {total} AS total_count FROM {source})
+    WHERE true
+    ON CONFLICT (sample_pk) DO UPDATE SET {updates}
+    WHERE {changed}
+    """
+
+# Set-based merge from the staging table into the star schema. Each upsert only
+# rewrites rows whose values actually changed. Enum values are mapped to their
+# lookup codes here; check_enums has already rejected any that aren't known.
+MERGE_SQL = [
+    """
+    INSERT INTO projects (project)
+    SELECT DISTINCT project FROM temp.staging
+    WHERE true
+    ON CONFLICT (project) DO NOTHING
+    """,
+    """
+    INSERT INTO subjects (subject_id, project_pk, condition_pk, age, sex_pk, treatment_pk, response_pk)
+    SELECT st.subject_id, p.project_pk, c.condition_pk, st.age, sx.sex_pk, t.treatment_pk, r.response_pk
+    FROM temp.staging st
+    JOIN projects p ON p.project = st.project
+    JOIN conditions c ON c.condition = st.condition
+    JOIN sexes sx ON sx.sex = st.sex
+    JOIN treatments t ON t.treatment = st.treatment
+    LEFT JOIN responses r ON r.response = st.response
+    WHERE true
+    GROUP BY st.subject_id
+    ON CONFLICT (subject_id) DO UPDATE SET
+        project_pk = excluded.project_pk, condition_pk = excluded.condition_pk, age = excluded.age,
+        sex_pk = excluded.sex_pk, treatment_pk = excluded.treatment_pk, response_pk = excluded.response_pk
+    WHERE project_pk IS NOT excluded.project_pk OR condition_pk IS NOT excluded.condition_pk
+        OR age IS NOT excluded.age OR sex_pk IS NOT excluded.sex_pk
+        OR treatment_pk IS NOT excluded.treatment_pk OR response_pk IS NOT excluded.response_pk
+    """,
+    """
+    INSERT INTO samples (sample, subject_pk, sample_type_pk, time)
+    SELECT st.sample, su.subject_pk, ty.sample_type_pk, st.time
+    FROM temp.staging st
+    JOIN subjects su ON su.subject_id = st.subject_id
+    JOIN sample_types ty ON ty.sample_type = st.sample_type
+    WHERE true
+    ON CONFLICT (sample) DO UPDATE SET
+        subject_pk = excluded.subject_pk, sample_type_pk = excluded.sample_type_pk, time = excluded.time
+    WHERE subject_pk IS NOT excluded.subject_pk OR sample_type_pk IS NOT excluded.sample_type_pk
+        OR time IS NOT excluded.time
+    """,
+    """
+    INSERT INTO cell_count_facts (sample_pk, b_cell, cd8_t_cell, cd4_t_cell, nk_cell, monocyte)
+    SELECT sa.sample_pk, st.b_cell, st.cd8_t_cell, st.cd4_t_cell, st.nk_cell, st.monocyte
+    FROM temp.staging st JOIN samples sa ON sa.sample = st.sample
+    WHERE true
+    ON CONFLICT (sample_pk) DO UPDATE SET
+        b_cell = excluded.b_cell, cd8_t_cell = excluded.cd8_t_cell, cd4_t_cell = excluded.cd4_t_cell,
+        nk_cell = excluded.nk_cell, monocyte = excluded.monocyte
+    WHERE b_cell IS NOT excluded.b_cell OR cd8_t_cell IS NOT excluded.cd8_t_cell
+        OR cd4_t_cell IS NOT excluded.cd4_t_cell OR nk_cell IS NOT excluded.nk_cell
+        OR monocyte IS NOT excluded.monocyte
+    """,
+    frequency_upsert_sql("temp.staging st JOIN samples sa ON sa.sample = st.sample"),
+]
+
+# Derives frequencies for any facts that don't have them yet (e.g. a database
+# built before the frequency table existed)
+BACKFILL_FREQUENCIES_SQL = frequency_upsert_sql(
+    f"cell_count_facts WHERE sample_pk NOT IN (SELECT sample_pk FROM {FREQUENCY_TABLE})"
+)
+
+def create_schema(conn):
+    """
+    Creates the normalized tables, the 'cell_counts' compatibility view, the
+    derived frequency table and view, and the watermark table if they don't exist yet.
+    """
+    existing = conn.execute(
+        "SELECT type FROM sqlite_master WHERE name = ?", (TABLE_NAME,)
+    ).fetchone()
+    if existing and existing[0] == 'table':
+        raise RuntimeError(
+            f"{DB_FILE} uses the old denormalized '{TABLE_NAME}' table; "
+            "rebuild it with a full load (python load_data.py) before loading incrementally."
+        )
+    subject_columns = [row[1] for row in conn.execute("PRAGMA table_info(subjects)")]
+    if subject_columns and enum_key('condition') not in subject_columns:
+        raise RuntimeError(
+            f"{DB_FILE} predates the typed schema (free-text enum columns); "
+            "rebuild it with a full load (python load_data.py) before loading incrementally."
+        )
+    column_defs = ", ".join(f"{col} {VIEW_COLUMNS[col]}" for col in DB_COLUMNS)
+    # WAL lets the pooled readers in data_access.py keep querying while a load is writing
+    conn.execute("PRAGMA journal_mode = WAL")
+    with conn:
+        conn.executescript(SCHEMA_SQL)
+        conn.executescript(cube_schema_sql())
+        conn.execute(f"CREATE TEMP TABLE IF NOT EXISTS staging ({column_defs})")
+
+def create_indexes(conn):
+    """Builds the secondary indexes and refreshes planner statistics with ANALYZE."""
+    with span('create_indexes'), conn:
+        conn.executescript(INDEX_SQL)
+        conn.execute("ANALYZE")
+
+def check_enums(df):
+    """
+    Rejects a chunk whose enum columns hold a value outside schema.ENUMS, or a
+    missing value where the column is required. Raises ValueError naming the
+    column, the number of bad rows and a few of the offending values.
+    """
+    for column, (_, allowed) in ENUMS.items():
+        values = df[column]
+        bad = ~values.isin(allowed)
+        if column in NULLABLE_COLUMNS:
+            bad &= values.notna()
+        if bad.any():
+            examples = sorted(set(values[bad].astype(str)))[:5]
+            raise ValueError(f"{bad.sum()} rows have an invalid '{column}' (allowed: {', '.join(allowed)}); "
+                             f"found {examples}")
+
+def load_frame(conn, df):
+    """
+    Merges a DataFrame of renamed CSV rows into the star schema in one transaction.
+    Rows are bulk-inserted into a temp staging table, then merged with set-based SQL.
+    Returns the number of samples that were new or changed.
     """
-    # Ensure we start fresh by removing the old database file if it exists
-    if os.path.exists(DB_FILE):
-        os.remove(DB_FILE)
-        print(f"Removed old database file: {DB_FILE}")
+    columns = ", ".join(DB_COLUMNS)
+    placeholders = ", ".join("?" for _ in DB_COLUMNS)
+    value_columns = [col for col in DB_COLUMNS if col != KEY_COLUMN]
+    changed = " OR ".join(f"c.{col} IS NOT st.{col}" for col in value_columns)
+    check_enums(df)
 
+    # sqlite3 needs None rather than NaN for missing values (e.g. 'response')
+    df = df[DB_COLUMNS].astype(object).where(df[DB_COLUMNS].notna(), None)
+    with conn:
+        conn.execute("DELETE FROM temp.staging")
+        with span('insert', rows=len(df)):
+            conn.executemany(f"INSERT INTO temp.staging ({columns}) VALUES ({placeholders})",
+                             df.itertuples(index=False, name=None))
+        with span('merge') as stage:
+            rows_written = conn.execute(f"""
+                SELECT COUNT(*) FROM temp.staging st
+                LEFT JOIN {TABLE_NAME} c ON c.{KEY_COLUMN} = st.{KEY_COLUMN}
+                WHERE c.{KEY_COLUMN} IS NULL OR {changed}
+            """).fetchone()[0]
+            for statement in MERGE_SQL:
+                conn.execute(statement)
+            stage.rows = rows_written
+        conn.execute("DELETE FROM temp.staging")
+    return rows_written
+
+def iter_csv_chunks(csv_file=CSV_FILE, chunksize=CHUNK_SIZE):
+    """Yields the CSV in chunks of 'chunksize' rows, renamed to database column names."""
+    reader = pd.read_csv(csv_file, dtype=CSV_DTYPES, chunksize=chunksize)
+    while True:
+        # Each chunk's parse is its own span, separate from its insert and merge
+        with span('read_csv', chunksize=chunksize) as stage:
+            chunk = next(reader, None)
+            stage.rows = 0 if chunk is None else len(chunk)
+        if chunk is None:
+            return
+        chunk.rename(columns=COLUMN_RENAMES, inplace=True)
+        yield chunk
+
+def column_values(df, column):
+    """Returns a column as a list of Python values, with None for missing values."""
+    values = df[column]
+    if values.hasnans:
+        values = values.astype(object).where(values.notna(), None)
+    return values.tolist()
+
+def encode_enums(df):
+    """Replaces each enum column of a checked chunk with its lookup code (nullable Int64)."""
+    for column in ENUMS:
+        df[enum_key(column)] = df[column].map(enum_codes(column)).astype('Int64')
+    return df
+
+def bulk_load(conn, chunks):
+    """
+    Loads DataFrame chunks into a freshly created, empty star schema. Unlike
+    load_frame, which stages rows and upserts them, this inserts straight into
+    the final tables with prepared executemany calls over column arrays, and
+    sample keys are assigned here rather than looked up. The whole load is one
+    transaction with the rollback journal off and synchronous=OFF, so a crash
+    mid-load leaves a database that must be rebuilt. Afterwards the database is
+    left in rollback-journal mode, so the finished file has no WAL sidecar and
+    can be renamed into place (the next incremental load turns WAL back on).
+    Frequencies are derived in one pass at the end. Subjects keep the
+    attributes of their first row. A sample that appears twice, an unknown
+    enum value or a value failing a CHECK constraint fails the load. Returns
+    the number of rows loaded.
+    """
+    for pragma, value in BULK_LOAD_PRAGMAS.items():
+        conn.execute(f"PRAGMA {pragma} = {value}")
+    project_pks = {}
+    rows = 0
     try:
-        # Load the raw data from the CSV file into a pandas DataFrame
-        df = pd.read_csv(CSV_FILE)
-        print(f"Successfully loaded data from {CSV_FILE}")
+        with conn:
+            for chunk in chunks:
+                check_enums(chunk)
+                chunk = encode_enums(chunk)
+                with span('insert', rows=len(chunk)):
+                    for project in chunk['project'].unique():
+                        if project not in project_pks:
+                            project_pks[project] = conn.execute(
+                                "INSERT INTO projects (project) VALUES (?)", (project,)).lastrowid
+                    subjects = chunk.drop_duplicates('subject_id')
+                    conn.executemany(
+                        "INSERT INTO subjects (subject_id, project_pk, condition_pk, age, sex_pk, treatment_pk, "
+                        "response_pk) VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (subject_id) DO NOTHING",
+                        zip(column_values(subjects, 'subject_id'), subjects['project'].map(project_pks).tolist(),
+                            *(column_values(subjects, col)
+                              for col in ['condition_pk', 'age', 'sex_pk', 'treatment_pk', 'response_pk']))
+                    )
+                    sample_pks = range(rows + 1, rows + len(chunk) + 1)
+                    conn.executemany(
+                        "INSERT INTO samples (sample_pk, sample, subject_pk, sample_type_pk, time) "
+                        "VALUES (?, ?, (SELECT subject_pk FROM subjects WHERE subject_id = ?), ?, ?)",
+                        zip(sample_pks, *(column_values(chunk, col)
+                                          for col in ['sample', 'subject_id', 'sample_type_pk', 'time']))
+                    )
+                    conn.executemany(
+                        f"INSERT INTO cell_count_facts (sample_pk, {', '.join(CELL_POPULATIONS)}) "
+                        f"VALUES (?, {', '.join('?' for _ in CELL_POPULATIONS)})",
+                        zip(sample_pks, *(column_values(chunk, pop) for pop in CELL_POPULATIONS))
+                    )
+                rows += len(chunk)
+            with span('merge', rows=rows):
+                conn.execute(frequency_upsert_sql("cell_count_facts"))
+    finally:
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA journal_mode = DELETE")
+    return rows
 
-        # Rename columns to be more database-friendly (no spaces, all lowercase)
-        df.rename(columns={
-            'subject': 'subject_id',
-            'time_from_treatment_start': 'time'
-        }, inplace=True)
+def file_sha256(path, block_size=1 << 20):
+    """Returns the hex SHA-256 digest of a file, read in fixed-size blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
 
-        # Establish a connection to the SQLite database
-        conn = sqlite3.connect(DB_FILE)
-        print(f"Database {DB_FILE} created.")
+def file_is_unchanged(conn, csv_file):
+    """
+    Checks the file against its recorded watermark. Size and mtime are compared
+    first; the content hash is only computed when those differ, so a touched but
+    otherwise identical file is still skipped.
+    """
+    stat = os.stat(csv_file)
+    row = conn.execute(
+        f"SELECT size, mtime, sha256 FROM {WATERMARK_TABLE} WHERE file_path = ?",
+        (os.path.abspath(csv_file),)
+    ).fetchone()
+    if row is None:
+        return False
+    size, mtime, sha256 = row
+    if size == stat.st_size and mtime == stat.st_mtime:
+        return True
+    if size == stat.st_size and sha256 == file_sha256(csv_file):
+        # Content is identical; refresh the mtime so the cheap check hits next time
+        with conn:
+            conn.execute(f"UPDATE {WATERMARK_TABLE} SET mtime = ? WHERE file_path = ?",
+                         (stat.st_mtime, os.path.abspath(csv_file)))
+        return True
+    return False
+
+def record_watermark(conn, csv_file, row_count):
+    """Stores the size, mtime and content hash of a successfully loaded file."""
+    stat = os.stat(csv_file)
+    with conn:
+        conn.execute(
+            f"INSERT OR REPLACE INTO {WATERMARK_TABLE} "
+            f"(file_path, size, mtime, sha256, row_count, loaded_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (os.path.abspath(csv_file), stat.st_size, stat.st_mtime, file_sha256(csv_file),
+             row_count, datetime.now(timezone.utc).isoformat())
+        )
+
+def build_cube(conn):
+    """
+    Rebuilds the cohort cube with one GROUP BY pass per measure. Min and max
+    can't be maintained under updates, so the cube is always rebuilt from scratch.
+    """
+    dimensions = ", ".join(CUBE_DIMENSIONS)
+    stat_columns = ", ".join(
+        f"{pop}_n, {pop}_sum, {pop}_sumsq, {pop}_min, {pop}_max" for pop in CELL_POPULATIONS
+    )
+    stats = ", ".join(
+        f"COUNT({pop}), SUM({pop}), SUM({pop} * {pop}), MIN({pop}), MAX({pop})" for pop in CELL_POPULATIONS
+    )
+    with span('build_cube'), conn:
+        conn.execute(f"DELETE FROM {CUBE_TABLE}")
+        for measure, view in CUBE_MEASURES.items():
+            conn.execute(
+                f"INSERT INTO {CUBE_TABLE} (measure, {dimensions}, {stat_columns}) "
+                f"SELECT ?, {dimensions}, {stats} FROM {view} GROUP BY {dimensions}",
+                (measure,)
+            )
+
+def finish_load(conn):
+    """
+    Rebuilds derived aggregates and stamps a new content version after data
+    changed. The version is stamped even if the rebuild fails, so cached results
+    never outlive the data they were computed from.
+    """
+    try:
+        build_cube(conn)
+    finally:
+        stamp_content_version(conn)
+
+def stamp_content_version(conn):
+    """
+    Records a new random content version. Anything cached against the previous
+    version (see query_cache.py) stops matching and is recomputed.
+    """
+    with conn:
+        conn.executemany(
+            f"INSERT OR REPLACE INTO {METADATA_TABLE} (key, value) VALUES (?, ?)",
+            [('content_version', uuid.uuid4().hex),
+             ('content_updated_at', datetime.now(timezone.utc).isoformat())]
+        )
+
+def backfill_frequencies(conn):
+    """Derives frequencies for any samples that lack them. Returns the number of rows added."""
+    with conn:
+        return conn.execute(BACKFILL_FREQUENCIES_SQL).rowcount
 
-        # Write the entire DataFrame to a new SQL table named 'cell_counts'
-        df.to_sql('cell_counts', conn, index=False, if_exists='replace')
-        print("Table 'cell_counts' created and populated.")
+def load_incremental(conn, csv_file=CSV_FILE, chunksize=CHUNK_SIZE):
+    """
+    Incrementally loads a CSV into an existing database. Files whose watermark
+    matches are skipped entirely; otherwise only new or changed samples are written.
+    The CSV is read in bounded chunks, each merged in its own transaction, so peak
+    memory is bounded by the chunk size rather than the file size. If a chunk
+    fails, the chunks already committed stay, the cube is still rebuilt and a new
+    content version is still stamped.
+    """
+    create_schema(conn)
+    if backfill_frequencies(conn):
+        finish_load(conn)
+    if file_is_unchanged(conn, csv_file):
+        print(f"Skipping {csv_file}: unchanged since last load.")
+        return 0
+
+    start = time.perf_counter()
+    rows_read = 0
+    rows_written = 0
+    try:
+        for chunk in iter_csv_chunks(csv_file, chunksize):
+            rows_written += load_frame(conn, chunk)
+            rows_read += len(chunk)
+        elapsed = time.perf_counter() - start
+        create_indexes(conn)
+        record_watermark(conn, csv_file, rows_read)
+    finally:
+        # Chunks commit one by one, so the cube and the content version must
+        # catch up even when a later chunk fails
+        if rows_written:
+            finish_load(conn)
+    print(f"Read {rows_read} rows from {csv_file}; {rows_written} new or changed rows upserted "
+          f"in {elapsed:.2f}s ({rows_read / max(elapsed, 1e-9):,.0f} rows/sec).")
+    return rows_written
+
+def parse_csv_file(csv_file):
+    """
+    Parses one CSV into a DataFrame with database column names. Runs in a worker
+    process, so it must not touch the database.
+    """
+    df = pd.read_csv(csv_file, dtype=CSV_DTYPES)
+    df.rename(columns=COLUMN_RENAMES, inplace=True)
+    return csv_file, df
+
+def load_files(conn, csv_files, workers=None):
+    """
+    Loads many CSV files (e.g. one per site per day) into the database.
+    Files are parsed concurrently in a process pool while this process acts as
+    the single writer, merging each parsed file in its own transaction in the
+    order given, so a later file overrides an earlier one for the same sample.
+    At most two files per worker are in flight, which bounds memory. Unchanged
+    files are skipped using their watermarks. If a file fails, the files already
+    merged stay, the cube is still rebuilt and a new content version is still
+    stamped. Returns rows written.
+    """
+    create_schema(conn)
+    if backfill_frequencies(conn):
+        finish_load(conn)
+
+    pending = []
+    for csv_file in csv_files:
+        if file_is_unchanged(conn, csv_file):
+            print(f"Skipping {csv_file}: unchanged since last load.")
+        else:
+            pending.append(csv_file)
+    if not pending:
+        return 0
+
+    workers = workers or os.cpu_count()
+    start = time.perf_counter()
+    rows_read = 0
+    rows_written = 0
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            queue = iter(pending)
+            # Parses finish in any order, but merges follow the command line (upserts are last-writer-wins)
+            in_flight = deque()
+            while True:
+                while len(in_flight) < workers * 2:
+                    csv_file = next(queue, None)
+                    if csv_file is None:
+                        break
+                    in_flight.append(pool.submit(parse_csv_file, csv_file))
+                if not in_flight:
+                    break
+                csv_file, df = in_flight.popleft().result()
+                written = load_frame(conn, df)
+                record_watermark(conn, csv_file, len(df))
+                rows_read += len(df)
+                rows_written += written
+                print(f"Loaded {csv_file}: {len(df)} rows, {written} new or changed.")
+
+        create_indexes(conn)
+    finally:
+        # Files commit one by one, so the cube and the content version must
+        # catch up even when a later file fails
+        if rows_written:
+            finish_load(conn)
+    elapsed = time.perf_counter() - start
+    print(f"Loaded {len(pending)} files ({rows_read} rows) with {workers} workers in {elapsed:.2f}s "
+          f"({rows_read / max(elapsed, 1e-9):,.0f} rows/sec).")
+    return rows_written
+
+def parquet_schema(view):
+    """Arrow schema for a view's Parquet copy: int32 counts, float32 percentages, string labels."""
+    import pyarrow as pa
+
+    fields = [
+        ('project', pa.string()), ('subject_id', pa.string()), ('condition', pa.string()),
+        ('age', pa.int32()), ('sex', pa.string()), ('treatment', pa.string()),
+        ('response', pa.string()), ('sample', pa.string()), ('sample_type', pa.string()),
+        ('time', pa.int32()),
+    ]
+    if view == FREQUENCY_VIEW:
+        fields += [('total_count', pa.int32())] + [(pop, pa.float32()) for pop in CELL_POPULATIONS]
+    else:
+        fields += [(pop, pa.int32()) for pop in CELL_POPULATIONS]
+    return pa.schema(fields)
+
+def export_parquet(conn, parquet_dir=PARQUET_DIR, chunksize=CHUNK_SIZE):
+    """
+    Writes the 'cell_counts' and 'cell_frequencies' views to Parquet datasets
+    partitioned by project and condition. Rows are streamed from SQLite in
+    chunks, so memory stays bounded. Any previous export is replaced.
+    """
+    try:
+        import pyarrow.dataset as ds
+    except ImportError:
+        raise ImportError("Parquet export requires pyarrow (pip install pyarrow).") from None
+
+    def write_view(view, use_arrow):
+        view_dir = os.path.join(parquet_dir, view)
+        if os.path.exists(view_dir):
+            shutil.rmtree(view_dir)
+        batches = iter_arrow_batches(f"SELECT * FROM {view}", parquet_schema(view), chunksize,
+                                     DB_FILE, use_arrow)
+        # One write per batch (Arrow consumes iterators on its own threads, which sqlite3 forbids)
+        for i, batch in enumerate(batches):
+            ds.write_dataset(
+                batch, view_dir, format='parquet',
+                partitioning=PARQUET_PARTITIONS, partitioning_flavor='hive',
+                basename_template=f"part-{i}-{{i}}.parquet",
+                existing_data_behavior='overwrite_or_ignore',
+            )
+
+    # Make sure pending writes on the caller's connection are visible to the export
+    conn.commit()
+    if os.path.exists(parquet_dir):
+        shutil.rmtree(parquet_dir)
+    for view in [TABLE_NAME, FREQUENCY_VIEW]:
+        try:
+            write_view(view, use_arrow=True)
+        except arrow_fallback_errors():
+            # ADBC couldn't type a column mid-stream; redo this view through pandas
+            write_view(view, use_arrow=False)
+    print(f"Parquet copy written to {parquet_dir}/ (partitioned by {', '.join(PARQUET_PARTITIONS)}).")
 
-        # Close the database connection
+def remove_database_files(db_file):
+    """Deletes a database file along with any journal, WAL or shared-memory files beside it."""
+    for suffix in ['', '-journal', '-wal', '-shm']:
+        if os.path.exists(db_file + suffix):
+            os.remove(db_file + suffix)
+
+def validate_database(db_file, expected_rows):
+    """
+    Checks a freshly built database before it is swapped into place: SQLite's
+    quick_check passes, both views hold every loaded row, the cohort cube is
+    populated and a content version is stamped. Raises RuntimeError listing
+    every failed check.
+    """
+    conn = sqlite3.connect(f"file:{db_file}?mode=ro", uri=True)
+    try:
+        problems = []
+        integrity = conn.execute("PRAGMA quick_check").fetchall()
+        if integrity != [('ok',)]:
+            problems.append(f"quick_check reported {'; '.join(row[0] for row in integrity[:5])}")
+        for view in [TABLE_NAME, FREQUENCY_VIEW]:
+            rows = conn.execute(f"SELECT COUNT(*) FROM {view}").fetchone()[0]
+            if rows != expected_rows:
+                problems.append(f"'{view}' has {rows} rows, expected {expected_rows}")
+        if expected_rows and not conn.execute(f"SELECT COUNT(*) FROM {CUBE_TABLE}").fetchone()[0]:
+            problems.append(f"'{CUBE_TABLE}' is empty")
+        if not conn.execute(
+            f"SELECT COUNT(*) FROM {METADATA_TABLE} WHERE key = 'content_version'"
+        ).fetchone()[0]:
+            problems.append("no content version was stamped")
+    finally:
         conn.close()
-        print("Database creation process complete.")
+    if problems:
+        raise RuntimeError(f"Validation of {db_file} failed: " + "; ".join(problems))
+
+def create_database(chunksize=None):
+    """
+    Creates and populates the SQLite database from the CSV file.
+    Data is stored in a normalized star schema (projects, subjects, samples and
+    a cell-count fact table), exposed through the 'cell_counts' view.
+
+    The new database is built in a staging file next to DB_FILE, validated, and
+    then renamed over DB_FILE in one atomic step. Readers keep querying the old
+    database for the whole load and pick up the new one on their next checkout
+    from the connection pool. If anything fails, the staging file is discarded
+    and the live database is left untouched.
+
+    If chunksize is given, the CSV is streamed in chunks of that many rows
+    instead of being loaded into memory all at once.
+    """
+    # Left behind by an interrupted run; never read by anything
+    remove_database_files(STAGING_DB_FILE)
+
+    try:
+        with span('create_database', chunksize=chunksize):
+            # Establish a connection to the staging database
+            conn = sqlite3.connect(STAGING_DB_FILE)
+            try:
+                create_schema(conn)
+                print(f"Staging database {STAGING_DB_FILE} created.")
+
+                start = time.perf_counter()
+                if chunksize:
+                    # Streaming mode: memory stays flat regardless of input size
+                    total_rows = bulk_load(conn, iter_csv_chunks(CSV_FILE, chunksize))
+                    print(f"Successfully streamed data from {CSV_FILE} in chunks of {chunksize} rows")
+                else:
+                    # Load the raw data from the CSV file into a pandas DataFrame
+                    with span('read_csv') as stage:
+                        df = pd.read_csv(CSV_FILE, dtype=CSV_DTYPES)
+                        stage.rows = len(df)
+                    print(f"Successfully loaded data from {CSV_FILE}")
+                    df.rename(columns=COLUMN_RENAMES, inplace=True)
+
+                    # Insert the entire DataFrame into the normalized tables
+                    total_rows = bulk_load(conn, [df])
+                # Indexes go on after the data lands so the bulk load doesn't maintain them row by row
+                create_indexes(conn)
+                elapsed = time.perf_counter() - start
+                print(f"Normalized tables populated; views '{TABLE_NAME}' and '{FREQUENCY_VIEW}' created.")
+                print(f"Loaded {total_rows} rows in {elapsed:.2f}s ({total_rows / max(elapsed, 1e-9):,.0f} rows/sec).")
+
+                # Record the file so later incremental runs can skip it
+                record_watermark(conn, CSV_FILE, total_rows)
+                finish_load(conn)
+            finally:
+                # Close the database connection
+                conn.close()
+
+            with span('validate', rows=total_rows):
+                validate_database(STAGING_DB_FILE, total_rows)
+            # rename() within one directory is atomic: readers see either the old file or the new one
+            with span('swap'):
+                os.replace(STAGING_DB_FILE, DB_FILE)
+                # The old database's WAL files would otherwise be replayed against the new one
+                for suffix in ['-wal', '-shm']:
+                    if os.path.exists(DB_FILE + suffix):
+                        os.remove(DB_FILE + suffix)
+            print(f"Database {DB_FILE} replaced atomically.")
+            print("Database creation process complete.")
 
     except FileNotFoundError:
         print(f"Error: The file '{CSV_FILE}' was not found.")
     except Exception as e:
         print(f"An error occurred: {e}")
+    finally:
+        if os.path.exists(STAGING_DB_FILE):
+            remove_database_files(STAGING_DB_FILE)
+            print(f"Discarded {STAGING_DB_FILE}; {DB_FILE} was left unchanged.")
 
 # --- Main execution block ---
+def main(argv=None):
+    """Command-line entry point; also run by `python cli.py load`."""
+    parser = argparse.ArgumentParser(description="Load cell-count.csv into the SQLite database.")
+    parser.add_argument('--stream', action='store_true',
+                        help="Stream the CSV in bounded chunks instead of loading it all at once.")
+    parser.add_argument('--chunksize', type=int, default=CHUNK_SIZE,
+                        help=f"Rows per chunk in streaming mode (default: {CHUNK_SIZE}).")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Upsert new or changed samples into the existing database instead of rebuilding it.")
+    parser.add_argument('--files', nargs='+', metavar='CSV',
+                        help="Load these CSV files into the existing database, parsing them in parallel.")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Worker processes for --files (default: number of CPUs).")
+    parser.add_argument('--parquet', action='store_true',
+                        help=f"Also write a partitioned Parquet copy to {PARQUET_DIR}/ (requires pyarrow).")
+    args = parser.parse_args(argv)
+    if args.files:
+        conn = sqlite3.connect(DB_FILE)
+        try:
+            load_files(conn, args.files, args.workers)
+        except FileNotFoundError as e:
+            print(f"Error: The file '{e.filename}' was not found.")
+        except Exception as e:
+            print(f"An error occurred: {e}")
+        finally:
+            conn.close()
+    elif args.incremental:
+        conn = sqlite3.connect(DB_FILE)
+        try:
+            load_incremental(conn, CSV_FILE, args.chunksize)
+        except FileNotFoundError:
+            print(f"Error: The file '{CSV_FILE}' was not found.")
+        except Exception as e:
+            print(f"An error occurred: {e}")
+        finally:
+            conn.close()
+    else:
+        create_database(chunksize=args.chunksize if args.stream else None)
+
+    if args.parquet:
+        conn = sqlite3.connect(DB_FILE)
+        try:
+            export_parquet(conn, PARQUET_DIR, args.chunksize)
+        except Exception as e:
+            print(f"An error occurred during Parquet export: {e}")
+        finally:
+            conn.close()
+
 if __name__ == "__main__":
-    create_database()
+    main()
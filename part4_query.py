@@ -1,29 +1,204 @@
-import pandas as pd
-import sqlite3
+import argparse
+
+from data_access import fetch_all, fetch_scalar
+from query_cache import get_cache, normalize_filters
+from instrumentation import span
+from schema import CELL_POPULATIONS, CUBE_DIMENSIONS, CUBE_MEASURES, CUBE_TABLE, DB_FILE, TABLE_NAME, VIEW_COLUMNS
+
+# --- Configuration ---
+# Database, view and column names come from schema.py
+AGGREGATE_FUNCTIONS = ['AVG', 'COUNT', 'SUM', 'MIN', 'MAX']
+# Column names can't be bound as parameters, so filters are restricted to known columns
+FILTER_COLUMNS = [column for column in VIEW_COLUMNS if column not in CELL_POPULATIONS]
+
+# Precomputed cohort cube (schema.CUBE_TABLE) built by load_data.py; filters on
+# schema.CUBE_DIMENSIONS can be answered from it
+CUBE_EXPRESSIONS = {
+    'AVG': "SUM({pop}_sum) * 1.0 / SUM({pop}_n)",
+    'COUNT': "COALESCE(SUM({pop}_n), 0)",
+    'SUM': "SUM({pop}_sum)",
+    'MIN': "MIN({pop}_min)",
+    'MAX': "MAX({pop}_max)",
+}
+AGGREGATE_SOURCES = ['auto', 'cube', 'samples']
+
+# Melanoma male responders at baseline (Part 4 bonus question)
+AVG_B_CELLS_FILTERS = {
+    'condition': 'melanoma',
+    'sample_type': 'PBMC',
+    'treatment': 'miraclib',
+    'sex': 'M',
+    'response': 'yes',
+    'time': 0,
+}
+
+def build_where(filters, allowed_columns):
+    """
+    Builds a parameterized WHERE clause from a filter dict. Each filter is a
+    column name mapped to a value: a scalar becomes 'col = ?', a list or tuple
+    becomes 'col IN (...)', and None becomes 'col IS NULL'. Returns (clause, params).
+    """
+    conditions = []
+    params = []
+    for column, value in filters.items():
+        if column not in allowed_columns:
+            raise ValueError(f"Cannot filter on '{column}'. Expected one of {allowed_columns}.")
+        if value is None:
+            conditions.append(f"{column} IS NULL")
+        elif isinstance(value, (list, tuple)):
+            conditions.append(f"{column} IN ({', '.join('?' for _ in value)})")
+            params.extend(value)
+        else:
+            conditions.append(f"{column} = ?")
+            params.append(value)
+    return " AND ".join(conditions), params
+
+def build_aggregate_query(population, func='AVG', source='auto', **filters):
+    """
+    Builds a parameterized aggregate query. With source='auto', filters that
+    only touch cube dimensions are answered from the precomputed cohort cube in
+    O(cells); anything else scans samples through the cell_counts view.
+    source='cube' or source='samples' forces one path. Returns (sql, params).
+    """
+    func = func.upper()
+    if population not in CELL_POPULATIONS:
+        raise ValueError(f"Unknown cell population '{population}'. Expected one of {CELL_POPULATIONS}.")
+    if func not in AGGREGATE_FUNCTIONS:
+        raise ValueError(f"Unknown aggregate '{func}'. Expected one of {AGGREGATE_FUNCTIONS}.")
+    if source not in AGGREGATE_SOURCES:
+        raise ValueError(f"Unknown source '{source}'. Expected one of {AGGREGATE_SOURCES}.")
+
+    use_cube = source == 'cube' or (source == 'auto' and all(col in CUBE_DIMENSIONS for col in filters))
+    if use_cube:
+        where, params = build_where(filters, CUBE_DIMENSIONS)
+        sql = (f"SELECT {CUBE_EXPRESSIONS[func].format(pop=population)} FROM {CUBE_TABLE} "
+               f"WHERE measure = 'count'")
+        if where:
+            sql += f" AND {where}"
+        return sql, params
+
+    where, params = build_where(filters, FILTER_COLUMNS)
+    sql = f"SELECT {func}({population}) FROM {TABLE_NAME}"
+    if where:
+        sql += f" WHERE {where}"
+    return sql, params
+
+def group_moments(group_column, measure='frequency', populations=CELL_POPULATIONS, source='auto',
+                  conn=None, **filters):
+    """
+    Computes per-group sufficient statistics (n, sum, sum of squares) for every
+    population in a single GROUP BY, e.g. the inputs to a t-test between
+    responders and non-responders. Like build_aggregate_query, source='auto'
+    reads the cohort cube when the grouping and filters allow it, and otherwise
+    aggregates the samples in the cell_counts or cell_frequencies view.
+    Returns {group_value: {population: (n, sum, sumsq)}}.
+    """
+    if measure not in CUBE_MEASURES:
+        raise ValueError(f"Unknown measure '{measure}'. Expected one of {list(CUBE_MEASURES)}.")
+    if source not in AGGREGATE_SOURCES:
+        raise ValueError(f"Unknown source '{source}'. Expected one of {AGGREGATE_SOURCES}.")
+    cube_columns = [group_column] + list(filters)
+    use_cube = source == 'cube' or (source == 'auto' and all(col in CUBE_DIMENSIONS for col in cube_columns))
+
+    if use_cube:
+        if group_column not in CUBE_DIMENSIONS:
+            raise ValueError(f"Cannot group on '{group_column}'. Expected one of {CUBE_DIMENSIONS}.")
+        where, params = build_where(filters, CUBE_DIMENSIONS)
+        stats = ", ".join(f"SUM({pop}_n), SUM({pop}_sum), SUM({pop}_sumsq)" for pop in populations)
+        sql = f"SELECT {group_column}, {stats} FROM {CUBE_TABLE} WHERE measure = ?"
+        params = [measure] + params
+        if where:
+            sql += f" AND {where}"
+    else:
+        if group_column not in FILTER_COLUMNS:
+            raise ValueError(f"Cannot group on '{group_column}'. Expected one of {FILTER_COLUMNS}.")
+        where, params = build_where(filters, FILTER_COLUMNS)
+        stats = ", ".join(f"COUNT({pop}), SUM({pop}), SUM({pop} * {pop})" for pop in populations)
+        sql = f"SELECT {group_column}, {stats} FROM {CUBE_MEASURES[measure]}"
+        if where:
+            sql += f" WHERE {where}"
+    sql += f" GROUP BY {group_column}"
+
+    rows = fetch_all(sql, params, conn, DB_FILE)
+    return {
+        row[0]: {pop: tuple(row[1 + 3 * i: 4 + 3 * i]) for i, pop in enumerate(populations)}
+        for row in rows
+    }
+
+def build_subject_count_query(group_column=None, **filters):
+    """
+    Builds a query counting distinct subjects in the cell_counts view, overall
+    or per value of group_column (NULL values excluded, ordered by value).
+    Returns (sql, params).
+    """
+    where, params = build_where(filters, FILTER_COLUMNS)
+    conditions = [where] if where else []
+    if group_column is None:
+        sql = f"SELECT COUNT(DISTINCT subject_id) FROM {TABLE_NAME}"
+    else:
+        if group_column not in FILTER_COLUMNS:
+            raise ValueError(f"Cannot group on '{group_column}'. Expected one of {FILTER_COLUMNS}.")
+        sql = f"SELECT {group_column}, COUNT(DISTINCT subject_id) FROM {TABLE_NAME}"
+        conditions.append(f"{group_column} IS NOT NULL")
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    if group_column is not None:
+        sql += f" GROUP BY {group_column} ORDER BY {group_column}"
+    return sql, params
+
+def subject_counts(group_columns, conn=None, **filters):
+    """
+    Counts distinct subjects matching the filters, overall and per value of
+    each group column, entirely in SQL. Returns (total, {column: [(value, count), ...]}).
+    """
+    sql, params = build_subject_count_query(None, **filters)
+    total = fetch_scalar(sql, params, conn, DB_FILE)
+    counts = {}
+    for column in group_columns:
+        sql, params = build_subject_count_query(column, **filters)
+        counts[column] = [tuple(row) for row in fetch_all(sql, params, conn, DB_FILE)]
+    return total, counts
+
+def aggregate(population, func='AVG', conn=None, use_cache=True, source='auto', **filters):
+    """
+    Computes a single aggregate (AVG/COUNT/SUM/MIN/MAX) of a cell population
+    inside SQLite and returns it as a scalar, without building a DataFrame.
+    Pass an open connection to reuse it across many lookups. Results are
+    memoized per database content version unless use_cache is False or a
+    connection is passed, since that connection may be to another database.
+    Like SQL, returns None when no rows match (except for COUNT, which returns 0).
+    """
+    sql, params = build_aggregate_query(population, func, source, **filters)
+    if not use_cache or conn is not None:
+        return fetch_scalar(sql, params, conn, DB_FILE)
+    key = {'population': population, 'func': func.upper(), 'source': source,
+           'filters': normalize_filters(filters)}
+    return get_cache(DB_FILE).get_or_compute(
+        'aggregate', key, lambda: fetch_scalar(sql, params, conn, DB_FILE)
+    )
+
+# Kept at module level so check_query_plans.py can verify it is index-served
+AVG_B_CELLS_QUERY, AVG_B_CELLS_PARAMS = build_aggregate_query('b_cell', 'AVG', **AVG_B_CELLS_FILTERS)
 
 def calculate_avg_b_cells():
     """
     Calculate average B cell count for melanoma male responders at baseline.
     (Answers Part 4 of the assignment)
     """
-    conn = sqlite3.connect('cell_counts.db')
-    query = """
-    SELECT b_cell
-    FROM cell_counts
-    WHERE
-        condition = 'melanoma' AND
-        sample_type = 'PBMC' AND
-        treatment = 'miraclib' AND
-        sex = 'M' AND
-        response = 'yes' AND
-        time = 0
-    """
-    df = pd.read_sql_query(query, conn)
-    average_count = df['b_cell'].mean()
-    conn.close()
-    
+    with span('query'):
+        average_count = aggregate('b_cell', 'AVG', **AVG_B_CELLS_FILTERS)
+    if average_count is None:
+        # No sample matched the filters
+        average_count = float('nan')
+
     print(f"Average B cells for melanoma male responders at baseline: {average_count:.2f}")
     return average_count
 
-if __name__ == "__main__":
+def main(argv=None):
+    """Command-line entry point; also run by `python cli.py avg-b-cells`."""
+    parser = argparse.ArgumentParser(description="Average B cells for melanoma male responders at baseline.")
+    parser.parse_args(argv)
     calculate_avg_b_cells()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from data_access import get_pool
+from schema import DB_FILE, METADATA_TABLE
+
+# --- Configuration ---
+CACHE_DB_FILE = "query_cache.db"
+MEMORY_ENTRIES = 1024
+
+def normalize_filters(filters):
+    """
+    Canonical form of a filter dict, so equivalent predicates share a cache key:
+    keys are sorted, and list/tuple values are de-duplicated and sorted.
+    """
+    normalized = {}
+    for column in sorted(filters):
+        value = filters[column]
+        if isinstance(value, (list, tuple, set)):
+            value = sorted(set(value), key=repr)
+        normalized[column] = value
+    return normalized
+
+def make_key(kind, version, **params):
+    """Hashes the request kind, its parameters and the database content version into a key."""
+    payload = json.dumps({'kind': kind, 'version': version, **params}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+class QueryCache:
+    """
+    Two-tier memoization for cohort query results. An in-process LRU answers
+    repeat requests in microseconds; an on-disk SQLite tier survives restarts
+    and is shared between processes. Keys include the database content version
+    stamped by load_data.py, so a new load invalidates every entry automatically.
+    """
+
+    def __init__(self, db_file=DB_FILE, cache_file=CACHE_DB_FILE, max_entries=MEMORY_ENTRIES):
+        self.db_file = db_file
+        self.cache_file = cache_file
+        self.max_entries = max_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._fingerprint = None
+        self._version = None
+        self._disk = None
+
+    def _file_fingerprint(self):
+        """Cheap stat-based signature of the database and its WAL; changes whenever a write lands."""
+        fingerprint = []
+        for path in [self.db_file, self.db_file + '-wal']:
+            try:
+                stat = os.stat(path)
+                fingerprint.append((stat.st_ino, stat.st_size, stat.st_mtime_ns))
+            except FileNotFoundError:
+                fingerprint.append(None)
+        return tuple(fingerprint)
+
+    def content_version(self):
+        """
+        Returns the content version stamped by load_data.py, or None if the
+        database has none. The version is only re-read when the files change.
+        """
+        fingerprint = self._file_fingerprint()
+        with self._lock:
+            if fingerprint == self._fingerprint:
+                return self._version
+        try:
+            with get_pool(self.db_file).connection() as conn:
+                row = conn.execute(
+                    f"SELECT value FROM {METADATA_TABLE} WHERE key = 'content_version'"
+                ).fetchone()
+        except sqlite3.OperationalError:
+            row = None
+        version = row[0] if row else None
+        with self._lock:
+            if version != self._version:
+                self._memory.clear()
+                self._prune_disk(version)
+            self._fingerprint, self._version = fingerprint, version
+        return version
+
+    def _disk_conn(self):
+        if self._disk is None:
+            self._disk = sqlite3.connect(self.cache_file, check_same_thread=False)
+            self._disk.execute("PRAGMA journal_mode = WAL")
+            with self._disk:
+                self._disk.execute(
+                    "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, version TEXT, value BLOB)"
+                )
+        return self._disk
+
+    def _prune_disk(self, version):
+        """Drops on-disk entries from other content versions. Caller holds the lock."""
+        if self._disk is not None or os.path.exists(self.cache_file):
+            with self._disk_conn() as disk:
+                disk.execute("DELETE FROM results WHERE version IS NOT ?", (version,))
+
+    def get_or_compute(self, kind, params, compute):
+        """
+        Returns the cached result for (kind, params) at the current content
+        version, calling compute() and storing its result on a miss. Results
+        are not cached when the database carries no content version.
+        """
+        version = self.content_version()
+        if version is None:
+            return compute()
+        key = make_key(kind, version, **params)
+
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+            row = self._disk_conn().execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            value = pickle.loads(row[0])
+        else:
+            value = compute()
+            with self._lock, self._disk_conn() as disk:
+                disk.execute("INSERT OR REPLACE INTO results (key, version, value) VALUES (?, ?, ?)",
+                             (key, version, pickle.dumps(value)))
+
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+        return value
+
+    def clear(self):
+        """Empties both tiers."""
+        with self._lock:
+            self._memory.clear()
+            if self._disk is not None or os.path.exists(self.cache_file):
+                with self._disk_conn() as disk:
+                    disk.execute("DELETE FROM results")
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+def get_cache(db_file=DB_FILE):
+    """Returns the shared result cache for a database file."""
+    key = os.path.abspath(db_file)
+    with _caches_lock:
+        if key not in _caches:
+            _caches[key] = QueryCache(db_file)
+        return _caches[key]
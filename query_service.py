@@ -0,0 +1,158 @@
+import argparse
+import asyncio
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from data_access import DB_FILE, POOL_SIZE, get_pool
+from part4_query import AVG_B_CELLS_FILTERS, CELL_POPULATIONS, build_aggregate_query, subject_counts
+
+# --- Configuration ---
+# Subject counts per group for a cohort, as in analysis.run_subset_analysis
+COHORT_GROUP_COLUMNS = ['project', 'response', 'sex']
+
+class _RunningQuery:
+    """Tracks the connection a worker thread is using, so the query can be interrupted."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._conn = None
+        self.cancelled = False
+
+    def attach(self, conn):
+        with self._lock:
+            if self.cancelled:
+                raise sqlite3.OperationalError("interrupted")
+            self._conn = conn
+
+    def detach(self):
+        with self._lock:
+            self._conn = None
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            if self._conn is not None:
+                self._conn.interrupt()
+
+class AsyncQueryService:
+    """
+    asyncio-native query API over the cell_counts database. Queries run on a
+    bounded pool of worker threads with pooled read-only connections, so a slow
+    cohort query only occupies one worker while the others keep serving.
+    Cancelling an awaiting task (or hitting an asyncio timeout) interrupts the
+    SQLite statement it was running.
+    """
+
+    def __init__(self, db_file=DB_FILE, max_concurrency=POOL_SIZE):
+        self.db_file = db_file
+        self._pool = get_pool(db_file)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency,
+                                            thread_name_prefix='query-service')
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _run(self, fn):
+        """Runs fn(conn) on a worker thread with a pooled connection."""
+        async with self._semaphore:
+            running = _RunningQuery()
+
+            def work():
+                with self._pool.connection() as conn:
+                    running.attach(conn)
+                    try:
+                        return fn(conn)
+                    finally:
+                        running.detach()
+
+            future = asyncio.get_running_loop().run_in_executor(self._executor, work)
+            try:
+                return await future
+            except asyncio.CancelledError:
+                running.cancel()
+                raise
+
+    async def fetch_all(self, query, params=()):
+        """Runs a query and returns all rows as tuples."""
+        return await self._run(lambda conn: conn.execute(query, list(params)).fetchall())
+
+    async def fetch_scalar(self, query, params=()):
+        """Runs a single-value query and returns the value."""
+        return await self._run(lambda conn: conn.execute(query, list(params)).fetchone()[0])
+
+    async def aggregate(self, population, func='AVG', **filters):
+        """Async counterpart of part4_query.aggregate."""
+        sql, params = build_aggregate_query(population, func, **filters)
+        return await self.fetch_scalar(sql, params)
+
+    async def cohort_summary(self, condition='melanoma', time=0):
+        """
+        Unique subject counts per project, response and sex for one cohort,
+        as reported by analysis.run_subset_analysis. Returns {column: {value: count}}.
+        """
+        def summarize(conn):
+            counts = subject_counts(COHORT_GROUP_COLUMNS, conn, condition=condition, time=time)[1]
+            return {column: dict(rows) for column, rows in counts.items()}
+        return await self._run(summarize)
+
+    def close(self):
+        """Waits for running queries to finish and stops the worker threads."""
+        self._executor.shutdown(wait=True)
+
+# --- Load generator ---
+
+async def _timed(request):
+    start = time.perf_counter()
+    await request
+    return time.perf_counter() - start
+
+def _random_request(service, rng):
+    """Picks a dashboard-style request: mostly aggregates, some cohort summaries."""
+    if rng.random() < 0.2:
+        return service.cohort_summary('melanoma', 0)
+    filters = dict(AVG_B_CELLS_FILTERS)
+    filters['sex'] = rng.choice(['M', 'F'])
+    filters['time'] = rng.choice([0, 7, 14])
+    return service.aggregate(rng.choice(CELL_POPULATIONS), rng.choice(['AVG', 'COUNT', 'MAX']), **filters)
+
+async def run_load(total_requests=2000, concurrency=64, max_workers=POOL_SIZE, seed=0):
+    """
+    Fires total_requests queries, at most 'concurrency' outstanding at a time,
+    and prints throughput and p50/p99 latency. Returns the latencies in seconds.
+    """
+    service = AsyncQueryService(max_concurrency=max_workers)
+    rng = random.Random(seed)
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with gate:
+            return await _timed(_random_request(service, rng))
+
+    try:
+        start = time.perf_counter()
+        latencies = np.array(await asyncio.gather(*(one() for _ in range(total_requests))))
+        elapsed = time.perf_counter() - start
+    finally:
+        service.close()
+
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+    print(f"{total_requests} requests, {concurrency} concurrent, {max_workers} workers: "
+          f"{total_requests / elapsed:,.0f} req/s, p50 {p50:.2f} ms, p99 {p99:.2f} ms")
+    return latencies
+
+# --- Main execution block ---
+def main(argv=None):
+    """Command-line entry point; also run by `python cli.py load-test`."""
+    parser = argparse.ArgumentParser(description="Local load generator for the async query service.")
+    parser.add_argument('--requests', type=int, default=2000, help="Total requests to send (default: 2000).")
+    parser.add_argument('--concurrency', type=int, default=64, help="Outstanding requests (default: 64).")
+    parser.add_argument('--workers', type=int, default=POOL_SIZE,
+                        help=f"Worker threads / pooled connections (default: {POOL_SIZE}).")
+    args = parser.parse_args(argv)
+    asyncio.run(run_load(args.requests, args.concurrency, args.workers))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+# --- Configuration ---
+# The database schema, shared by load_data.py (which creates it) and by
+# analysis.py and part4_query.py (which query it). Only plain Python lives here,
+# so importing it costs nothing for the text-only commands.
+DB_FILE = "cell_counts.db"
+TABLE_NAME = "cell_counts"
+FREQUENCY_TABLE = "sample_frequencies"
+# Per-sample relative frequencies (% of total cells), derived and cached by load_data.py
+FREQUENCY_VIEW = "cell_frequencies"
+WATERMARK_TABLE = "load_watermarks"
+# Holds the content version stamped on every load that changes data; result caches key on it
+METADATA_TABLE = "db_metadata"
+CELL_POPULATIONS = ['b_cell', 'cd8_t_cell', 'cd4_t_cell', 'nk_cell', 'monocyte']
+# Optional columnar copy of both views, written by `python load_data.py --parquet` (requires pyarrow)
+PARQUET_DIR = "cell_counts_parquet"
+
+# Materialized aggregates per cohort cell, for both raw counts and relative frequencies
+CUBE_TABLE = "cohort_cube"
+CUBE_DIMENSIONS = ['condition', 'treatment', 'sex', 'response', 'time', 'sample_type']
+CUBE_MEASURES = {'count': TABLE_NAME, 'frequency': FREQUENCY_VIEW}
+
+# Closed vocabularies: column -> (lookup table, allowed values). Each value is stored
+# once in its lookup table; subjects and samples hold its integer code (1..n in this order).
+ENUMS = {
+    'condition': ('conditions', ['melanoma', 'carcinoma', 'healthy']),
+    'treatment': ('treatments', ['miraclib', 'phauximab', 'none']),
+    'sex': ('sexes', ['M', 'F']),
+    'response': ('responses', ['yes', 'no']),
+    'sample_type': ('sample_types', ['PBMC', 'WB']),
+}
+# Enum columns that may be missing; healthy subjects have no treatment response
+NULLABLE_COLUMNS = ['response']
+AGE_RANGE = (0, 150)
+
+# Columns of the 'cell_counts' view, in CSV order, with their SQL types
+VIEW_COLUMNS = {
+    'project': 'TEXT',
+    'subject_id': 'TEXT',
+    'condition': 'TEXT',
+    'age': 'INTEGER',
+    'sex': 'TEXT',
+    'treatment': 'TEXT',
+    'response': 'TEXT',
+    'sample': 'TEXT',
+    'sample_type': 'TEXT',
+    'time': 'INTEGER',
+    **{pop: 'INTEGER' for pop in CELL_POPULATIONS},
+}
+
+def enum_codes(column):
+    """Returns {value: integer code} for an enum column."""
+    return {value: code for code, value in enumerate(ENUMS[column][1], start=1)}
+
+def enum_key(column):
+    """Name of the code column that subjects/samples hold for an enum column, e.g. 'sex_pk'."""
+    return f"{column}_pk"
+
+def lookup_tables_sql():
+    """DDL for one STRICT lookup table per enum, seeded with its allowed values."""
+    statements = []
+    for column, (table, values) in ENUMS.items():
+        allowed = ", ".join(f"'{value}'" for value in values)
+        rows = ", ".join(f"({code}, '{value}')" for value, code in enum_codes(column).items())
+        statements.append(f"""
+CREATE TABLE IF NOT EXISTS {table} (
+    {enum_key(column)} INTEGER PRIMARY KEY,
+    {column} TEXT NOT NULL UNIQUE CHECK ({column} IN ({allowed}))
+) STRICT;
+INSERT OR IGNORE INTO {table} ({enum_key(column)}, {column}) VALUES {rows};""")
+    return "\n".join(statements)
+
+def _enum_columns(column):
+    """
+    Column definitions for an enum on subjects/samples: the stored integer code,
+    plus a virtual generated column decoding it back to text. The text column
+    takes no space in the table, can be indexed, and lets the views expose the
+    value without joining the lookup table on every row.
+    """
+    table = ENUMS[column][0]
+    not_null = "" if column in NULLABLE_COLUMNS else " NOT NULL"
+    cases = " ".join(f"WHEN {code} THEN '{value}'" for value, code in enum_codes(column).items())
+    return (f"{enum_key(column)} INTEGER{not_null} REFERENCES {table} ({enum_key(column)}),\n"
+            f"    {column} TEXT GENERATED ALWAYS AS (CASE {enum_key(column)} {cases} END) VIRTUAL")
+
+_COUNT_DEFS = ",\n    ".join(f"{pop} INTEGER NOT NULL CHECK ({pop} >= 0)" for pop in CELL_POPULATIONS)
+# Percentages are NULL when a sample's total count is zero
+_FREQUENCY_DEFS = ",\n    ".join(f"{pop} REAL CHECK ({pop} BETWEEN 0 AND 100)" for pop in CELL_POPULATIONS)
+
+# Normalized star schema. Subject-level attributes live on 'subjects', sample-level
+# attributes on 'samples', and the five counts on a narrow fact table keyed by sample.
+# Closed vocabularies are stored as integer codes into lookup tables. Every table
+# is STRICT, so a value of the wrong type is an error instead of being stored
+# as-is, and CHECK constraints reject out-of-range values during ingest. The 'cell_counts'
+# view re-joins the tables and exposes the decoded text values, so queries keep
+# working unchanged.
+SCHEMA_SQL = lookup_tables_sql() + f"""
+CREATE TABLE IF NOT EXISTS projects (
+    project_pk INTEGER PRIMARY KEY,
+    project TEXT NOT NULL UNIQUE CHECK (project <> '')
+) STRICT;
+CREATE TABLE IF NOT EXISTS subjects (
+    subject_pk INTEGER PRIMARY KEY,
+    subject_id TEXT NOT NULL UNIQUE CHECK (subject_id <> ''),
+    project_pk INTEGER NOT NULL REFERENCES projects (project_pk),
+    {_enum_columns('condition')},
+    age INTEGER NOT NULL CHECK (age BETWEEN {AGE_RANGE[0]} AND {AGE_RANGE[1]}),
+    {_enum_columns('sex')},
+    {_enum_columns('treatment')},
+    {_enum_columns('response')}
+) STRICT;
+CREATE TABLE IF NOT EXISTS samples (
+    sample_pk INTEGER PRIMARY KEY,
+    sample TEXT NOT NULL UNIQUE CHECK (sample <> ''),
+    subject_pk INTEGER NOT NULL REFERENCES subjects (subject_pk),
+    {_enum_columns('sample_type')},
+    time INTEGER NOT NULL CHECK (time >= 0)
+) STRICT;
+CREATE TABLE IF NOT EXISTS cell_count_facts (
+    sample_pk INTEGER PRIMARY KEY REFERENCES samples (sample_pk),
+    {_COUNT_DEFS}
+) STRICT;
+CREATE VIEW IF NOT EXISTS {TABLE_NAME} AS
+SELECT
+    p.project, su.subject_id, su.condition, su.age, su.sex, su.treatment, su.response,
+    sa.sample, sa.sample_type, sa.time,
+    f.b_cell, f.cd8_t_cell, f.cd4_t_cell, f.nk_cell, f.monocyte
+FROM cell_count_facts f
+JOIN samples sa ON sa.sample_pk = f.sample_pk
+JOIN subjects su ON su.subject_pk = sa.subject_pk
+JOIN projects p ON p.project_pk = su.project_pk;
+CREATE TABLE IF NOT EXISTS {FREQUENCY_TABLE} (
+    sample_pk INTEGER PRIMARY KEY REFERENCES samples (sample_pk),
+    total_count INTEGER NOT NULL CHECK (total_count >= 0),
+    {_FREQUENCY_DEFS}
+) STRICT;
+CREATE VIEW IF NOT EXISTS {FREQUENCY_VIEW} AS
+SELECT
+    p.project, su.subject_id, su.condition, su.age, su.sex, su.treatment, su.response,
+    sa.sample, sa.sample_type, sa.time,
+    fr.total_count, fr.b_cell, fr.cd8_t_cell, fr.cd4_t_cell, fr.nk_cell, fr.monocyte
+FROM {FREQUENCY_TABLE} fr
+JOIN samples sa ON sa.sample_pk = fr.sample_pk
+JOIN subjects su ON su.subject_pk = sa.subject_pk
+JOIN projects p ON p.project_pk = su.project_pk;
+CREATE TABLE IF NOT EXISTS {METADATA_TABLE} (
+    key TEXT PRIMARY KEY,
+    value TEXT
+) STRICT;
+CREATE TABLE IF NOT EXISTS {WATERMARK_TABLE} (
+    file_path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime REAL,
+    sha256 TEXT,
+    row_count INTEGER,
+    loaded_at TEXT
+) STRICT;
+"""
+
+def cube_schema_sql():
+    """
+    DDL for the cohort cube: one row per measure and combination of the cube
+    dimensions, with count, sum, sum of squares, min and max of every population.
+    Sums are integers for counts and reals for frequencies, so they are typed ANY.
+    """
+    dimension_defs = ",\n    ".join(
+        f"{dim} {VIEW_COLUMNS[dim]}" for dim in CUBE_DIMENSIONS
+    )
+    stat_defs = ",\n    ".join(
+        f"{pop}_n INTEGER, {pop}_sum ANY, {pop}_sumsq ANY, {pop}_min ANY, {pop}_max ANY"
+        for pop in CELL_POPULATIONS
+    )
+    return f"""
+CREATE TABLE IF NOT EXISTS {CUBE_TABLE} (
+    measure TEXT NOT NULL CHECK (measure IN ({', '.join(f"'{m}'" for m in CUBE_MEASURES)})),
+    {dimension_defs},
+    {stat_defs}
+) STRICT;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_{CUBE_TABLE}_cell ON {CUBE_TABLE} (measure, {', '.join(CUBE_DIMENSIONS)});
+"""
+
+# Secondary indexes matching the access paths of the shipped queries: condition +
+# time (Part 4 subset) and the six-column predicate in part4_query.py. They index
+# the decoded enum columns, so filters on the views' text values can use them.
+# Part 3 reads most PBMC samples and deliberately scans 'samples', so it gets no
+# index; older databases drop the one it used to have. The indexes are built
+# after the bulk load, then ANALYZE refreshes the planner statistics.
+INDEX_SQL = """
+CREATE INDEX IF NOT EXISTS idx_subjects_cohort ON subjects (condition, treatment, sex, response);
+CREATE INDEX IF NOT EXISTS idx_samples_subject ON samples (subject_pk, time, sample_type, sample);
+DROP INDEX IF EXISTS idx_samples_type_time;
+"""
@@ -0,0 +1,235 @@
+import numpy as np
+
+# --- Configuration ---
+# t-digest compression: higher keeps more centroids (about compression / 2) and tighter quantiles
+DIGEST_COMPRESSION = 200
+# Values buffered before they are folded into the centroids
+DIGEST_BUFFER_SIZE = 10_000
+# Tukey whisker reach, in multiples of the interquartile range (as in matplotlib and seaborn)
+WHISKER_RANGE = 1.5
+# Smallest and largest values kept per population, the candidates for drawn outliers
+TAIL_SIZE = 200
+
+class RunningStats:
+    """
+    Welford-style running count, mean and sum of squared deviations for several
+    columns at once. Each chunk's statistics are computed with numpy and folded
+    in with Chan's parallel update, so accuracy matches a two-pass computation
+    and memory is O(columns) however many rows stream through. NaNs are skipped.
+    """
+
+    def __init__(self, n_columns):
+        self.n = np.zeros(n_columns)
+        self.mean = np.zeros(n_columns)
+        self.m2 = np.zeros(n_columns)
+
+    def update(self, values):
+        """Folds in a 2-D array (rows x columns) of new observations."""
+        values = np.asarray(values, dtype=float)
+        if values.ndim == 1:
+            values = values[:, None]
+        n_chunk = np.sum(~np.isnan(values), axis=0).astype(float)
+        seen = n_chunk > 0
+        if not seen.any():
+            return
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean_chunk = np.where(seen, np.nansum(values, axis=0) / n_chunk, 0)
+        m2_chunk = np.nansum((values - mean_chunk) ** 2, axis=0)
+
+        total = self.n + n_chunk
+        with np.errstate(divide='ignore', invalid='ignore'):
+            delta = mean_chunk - self.mean
+            self.mean = np.where(seen, self.mean + delta * n_chunk / total, self.mean)
+            self.m2 = np.where(seen, self.m2 + m2_chunk + delta ** 2 * self.n * n_chunk / total, self.m2)
+        self.n = total
+
+    def merge(self, other):
+        """Combines another accumulator's observations into this one."""
+        total = self.n + other.n
+        with np.errstate(divide='ignore', invalid='ignore'):
+            delta = other.mean - self.mean
+            mean = np.where(total > 0, self.mean + delta * other.n / total, 0)
+            m2 = np.where(total > 0, self.m2 + other.m2 + delta ** 2 * self.n * other.n / total, 0)
+        self.n, self.mean, self.m2 = total, mean, m2
+
+    @property
+    def std(self):
+        """Sample standard deviation (ddof=1); NaN for columns with fewer than two observations."""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(self.n > 1, np.sqrt(self.m2 / (self.n - 1)), np.nan)
+
+class TDigest:
+    """
+    Merging t-digest quantile sketch. Incoming values are buffered, then sorted
+    together with the existing centroids and collapsed so each centroid spans at
+    most one unit of the arcsine scale function. Centroids stay small near the
+    tails and larger around the median, so the quartiles and extremes a boxplot
+    needs are accurate with a few hundred floats of state. Min and max are exact.
+    """
+
+    def __init__(self, compression=DIGEST_COMPRESSION, buffer_size=DIGEST_BUFFER_SIZE):
+        self.compression = compression
+        self.buffer_size = buffer_size
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.min = np.inf
+        self.max = -np.inf
+        self._buffer = []
+        self._buffered = 0
+
+    @property
+    def count(self):
+        return self.weights.sum() + self._buffered
+
+    def update(self, values):
+        """Adds a 1-D array of observations; NaNs are skipped."""
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self._buffer.append(values)
+        self._buffered += len(values)
+        if self._buffered >= self.buffer_size:
+            self._compress()
+
+    def merge(self, other):
+        """Combines another digest's observations into this one."""
+        other._compress()
+        if not len(other.weights):
+            return
+        self._compress(other.means, other.weights)
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def _compress(self, extra_means=None, extra_weights=None):
+        parts = [self.means] + self._buffer
+        weights = [self.weights] + [np.ones(len(chunk)) for chunk in self._buffer]
+        if extra_means is not None:
+            parts.append(extra_means)
+            weights.append(extra_weights)
+        self._buffer, self._buffered = [], 0
+        means, weights = np.concatenate(parts), np.concatenate(weights)
+        if not len(means):
+            return
+
+        order = np.argsort(means, kind='stable')
+        means, weights = means[order], weights[order]
+        cumulative = np.cumsum(weights)
+        # Quantile at each point's midpoint, mapped onto the arcsine scale k(q)
+        q = (cumulative - weights / 2) / cumulative[-1]
+        k = self.compression / (2 * np.pi) * np.arcsin(2 * q - 1)
+        # k is monotone, so flooring it yields contiguous groups of neighbouring points
+        group = np.floor(k - k[0]).astype(int)
+        group = np.unique(group, return_inverse=True)[1]
+        self.weights = np.bincount(group, weights)
+        self.means = np.bincount(group, weights * means) / self.weights
+
+    def quantile(self, q):
+        """Estimates the q-th quantile (0 <= q <= 1, scalar or array); NaN if empty."""
+        self._compress()
+        if not len(self.weights):
+            return np.full(np.shape(q), np.nan) if np.ndim(q) else np.nan
+        # Centroid means sit at their midpoints in rank space; the exact extremes anchor both ends
+        cumulative = np.cumsum(self.weights)
+        positions = np.concatenate([[0], cumulative - self.weights / 2, [cumulative[-1]]])
+        values = np.concatenate([[self.min], self.means, [self.max]])
+        return np.interp(np.asarray(q) * cumulative[-1], positions, values)
+
+class TailSample:
+    """Keeps the k smallest and k largest values seen, in O(k) memory."""
+
+    def __init__(self, k=TAIL_SIZE):
+        self.k = k
+        self.low = np.empty(0)
+        self.high = np.empty(0)
+
+    def update(self, values):
+        """Adds a 1-D array of observations; NaNs are skipped."""
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        self._keep(np.concatenate([self.low, values]), np.concatenate([self.high, values]))
+
+    def merge(self, other):
+        self._keep(np.concatenate([self.low, other.low]), np.concatenate([self.high, other.high]))
+
+    def _keep(self, low, high):
+        if len(low) > self.k:
+            low = np.partition(low, self.k - 1)[:self.k]
+        if len(high) > self.k:
+            high = np.partition(high, len(high) - self.k)[-self.k:]
+        self.low, self.high = low, high
+
+    def outside(self, low_limit, high_limit):
+        """Kept values below low_limit or above high_limit, sorted."""
+        # The two tails can overlap when fewer than 2k values were seen
+        values = np.unique(np.concatenate([self.low, self.high]))
+        return values[(values < low_limit) | (values > high_limit)]
+
+def box_stats(digest, tails=None, whisker_range=WHISKER_RANGE):
+    """
+    Boxplot summary of a digest: quartiles, median and Tukey whiskers (the most
+    extreme values within 1.5 IQR of the box). When 'tails' (a TailSample) holds
+    a value inside a fence, the whisker is exact; otherwise it falls back to the
+    fence clipped to the observed range. Outliers are the tail values beyond the
+    whiskers. Returns a dict in the format matplotlib's bxp() takes.
+    """
+    q1, median, q3 = digest.quantile([0.25, 0.5, 0.75])
+    iqr = q3 - q1
+    low_fence, high_fence = q1 - whisker_range * iqr, q3 + whisker_range * iqr
+    whislo, whishi = max(digest.min, low_fence), min(digest.max, high_fence)
+    fliers = np.empty(0)
+    if tails is not None:
+        low_inside = tails.low[tails.low >= low_fence]
+        high_inside = tails.high[tails.high <= high_fence]
+        if len(low_inside):
+            whislo = low_inside.min()
+        if len(high_inside):
+            whishi = high_inside.max()
+        fliers = tails.outside(low_fence, high_fence)
+    return {
+        'q1': q1,
+        'med': median,
+        'q3': q3,
+        'whislo': whislo,
+        'whishi': whishi,
+        'fliers': fliers,
+        'min': digest.min,
+        'max': digest.max,
+        'n': int(digest.count),
+    }
+
+class StreamingSummary:
+    """
+    Bounded-memory summary of one group (e.g. responders) across populations:
+    running moments for significance tests, plus one t-digest and tail sample
+    per population for boxplot statistics. Feed it chunks of a (rows x populations) array.
+    """
+
+    def __init__(self, populations, compression=DIGEST_COMPRESSION, tail_size=TAIL_SIZE):
+        self.populations = list(populations)
+        self.stats = RunningStats(len(self.populations))
+        self.digests = {pop: TDigest(compression) for pop in self.populations}
+        self.tails = {pop: TailSample(tail_size) for pop in self.populations}
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        self.stats.update(values)
+        for i, pop in enumerate(self.populations):
+            self.digests[pop].update(values[:, i])
+            self.tails[pop].update(values[:, i])
+
+    def merge(self, other):
+        self.stats.merge(other.stats)
+        for pop in self.populations:
+            self.digests[pop].merge(other.digests[pop])
+            self.tails[pop].merge(other.tails[pop])
+
+    def summary_stats(self):
+        """Returns (n, mean, std) arrays in population order, as compare_summaries() takes."""
+        return self.stats.n, self.stats.mean, self.stats.std
+
+    def box_stats(self):
+        """Returns {population: box_stats dict}."""
+        return {pop: box_stats(self.digests[pop], self.tails[pop]) for pop in self.populations}